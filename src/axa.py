@@ -1,24 +1,222 @@
 #!/usr/local/bin/python
 
 import argparse
+import copy
+import csv
+import hashlib
+import heapq
+import json
 import logging
+import os
+import queue
+import random
+import re
+import requests
+import shutil
+import signal
+import sqlite3
+import sys
+import threading
+import tracemalloc
 import yaml
 
-from selenium.webdriver import *
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.select import Select
-from selenium.webdriver.chrome.service import Service
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer
 
-from webdriver_manager.chrome import ChromeDriverManager
+# the rest of Selenium is imported by _import_selenium once it is needed
+from selenium.common.exceptions import NoSuchElementException
+from selenium.common.exceptions import TimeoutException
+
+from requests.adapters import HTTPAdapter
 
 from prometheus_client import Counter
 from prometheus_client import Gauge
-from prometheus_client import start_http_server
+from prometheus_client import Histogram
+from prometheus_client import MetricsHandler
+
+from time import sleep, time, perf_counter
+from urllib.parse import urljoin, urlparse, parse_qs
+from datetime import timedelta
+
+# First suggestion shown under the occupation and address fields
+AUTOCOMPLETE_SUGGESTION_ID = "react-autowhatever-1--item-0"
+# Form fields filled in on each page of the quote wizard by both fill modes,
+# in the order they are filled in. Each field is (locator type, locator,
+# action, key into the values from _get_form_values). Radio buttons are
+# clicked through their parent label like the user would.
+FORM_PAGES = {
+    "vehicle_details": [
+        ("xpath", "//*[@id='VehicleDetails.IsVehicleForBusinessUse2']/..", "click", None),
+        ("xpath", "//*[@id='VehicleDetails.IsVehicleForCommutingUse1']/..", "click", None),
+        ("id", "VehicleDetails.AnnualDistanceDrivenTypeId", "select", "annual_distance"),
+    ],
+    "proposer_details": [
+        ("xpath", "//*[@id='ProposerDetails.TitleTypeId1']/..", "click", None),
+        ("id", "ProposerDetails.FirstName", "input", "first_name"),
+        ("id", "ProposerDetails.LastName", "input", "last_name"),
+        ("id", "ProposerDetails.DateOfBirth.Day", "input", "date_of_birth_day"),
+        ("id", "ProposerDetails.DateOfBirth.Month", "input", "date_of_birth_month"),
+        ("id", "ProposerDetails.DateOfBirth.Year", "input", "date_of_birth_year"),
+        ("id", "ProposerDetails.EmailAddress", "input", "email"),
+        ("xpath", "//input[@name='phone-number']", "input", "phone_number"),
+        ("xpath", "//*[@id='ProposerDetails.EmploymentStatusTypeId1']/..", "click", None),
+        ("id", "ProposerDetails.OccupationTypeDescription", "autocomplete", "occupation"),
+        ("id", "ProposerDetails.AddressDisplayFormatted", "autocomplete", "eir_code"),
+        ("xpath", "//*[@id='ProposerDetails.HouseHoldTypeId1']/..", "click", None),
+    ],
+    "driving_history": [
+        ("xpath", "//*[@id='DrivingHistory.DrivingLicenceTypeId2']/..", "click", None),
+        ("xpath", "//*[@id='DrivingHistory.AdvancedDriverTrainingTypeId2']/..", "click", None),
+        ("id", "DrivingHistory.YearsLicenceHeldTypeId", "select", "license_held"),
+        ("xpath", "//*[@id='DrivingHistory.PenaltyPointsDetails.HasPenaltyPoints2']/..", "click", None),
+        ("xpath", "//*[@id='DrivingHistory.DrivingExperienceTypeId2']/..", "click", None),
+        ("xpath", "//*[@id='CoverDetails.HasMultiProductDiscount2']/..", "click", None),
+    ],
+}
+
+# Fills in every field of a page in one WebDriver call. Elements are waited
+# for inside the page and values are set through the native setters followed
+# by input/change events, as React ignores plain assignments to .value.
+# Once a field fails the remaining ones are only tried without waiting.
+FILL_PAGE_SCRIPT = """
+var fields = arguments[0], timeoutMs = arguments[1], suggestionId = arguments[2];
+var done = arguments[arguments.length - 1];
+
+function find(field) {
+    if (field.by === "id") {
+        return document.getElementById(field.locator);
+    }
+    return document.evaluate(field.locator, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+}
+
+function waitFor(field, waitMs) {
+    var deadline = Date.now() + waitMs;
+    return new Promise(function (resolve, reject) {
+        (function poll() {
+            var element = find(field);
+            if (element) {
+                resolve(element);
+            } else if (Date.now() >= deadline) {
+                reject(new Error("element not found"));
+            } else {
+                setTimeout(poll, 50);
+            }
+        })();
+    });
+}
+
+function setValue(element, value) {
+    var prototype = element instanceof HTMLSelectElement ? HTMLSelectElement.prototype : HTMLInputElement.prototype;
+    Object.getOwnPropertyDescriptor(prototype, "value").set.call(element, value);
+    element.dispatchEvent(new Event("input", {bubbles: true}));
+    element.dispatchEvent(new Event("change", {bubbles: true}));
+}
+
+async function apply(field, waitMs) {
+    var element = await waitFor(field, waitMs);
+    if (field.action === "click") {
+        element.click();
+    } else if (field.action === "input") {
+        element.focus();
+        setValue(element, field.value);
+        element.blur();
+    } else if (field.action === "select") {
+        var option = Array.prototype.find.call(element.options, function (option) {
+            return option.text.trim() === field.value;
+        });
+        if (!option) {
+            throw new Error("no option with text '" + field.value + "'");
+        }
+        setValue(element, option.value);
+    } else if (field.action === "autocomplete") {
+        element.focus();
+        setValue(element, field.value);
+        var suggestion = await waitFor({by: "id", locator: suggestionId}, waitMs);
+        suggestion.click();
+    } else {
+        throw new Error("unknown action '" + field.action + "'");
+    }
+}
+
+(async function () {
+    var failed = [];
+    for (var i = 0; i < fields.length; i++) {
+        try {
+            await apply(fields[i], failed.length ? 0 : timeoutMs);
+        } catch (e) {
+            failed.push({locator: fields[i].locator, action: fields[i].action, error: String(e && e.message || e)});
+        }
+    }
+    done({failed: failed});
+})();
+"""
+
+# URL patterns blocked through the DevTools protocol for each resource type
+# when using the lean browser profile. The patterns match the whole URL, so
+# they end in a wildcard to match URLs with a query string or fragment too.
+BLOCKED_RESOURCE_TYPE_PATTERNS = {
+    "image": ["*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.svg*", "*.ico*"],
+    "font": ["*.woff*", "*.ttf*", "*.otf*", "*.eot*"],
+    "media": ["*.mp4*", "*.webm*", "*.mp3*", "*.ogg*", "*.m4a*", "*.m3u8*"],
+}
 
-from time import sleep
-from datetime import timedelta, datetime
+# Chrome features that cost memory and CPU without helping fill in a form
+LEAN_BROWSER_ARGUMENTS = [
+    "--disable-gpu",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-domain-reliability",
+    "--disable-client-side-phishing-detection",
+    "--disable-sync",
+    "--disable-features=Translate,OptimizationHints,MediaRouter,InterestFeedContentSuggestions",
+    "--metrics-recording-only",
+    "--mute-audio",
+    "--no-first-run",
+]
+
+DEFAULT_BASE_URL = "https://www.axa.ie/"
+
+# Irish registrations once spaces and dashes are removed, e.g. '08C100'
+REGISTRATION_PATTERN = re.compile(r"^[0-9A-Z]{2,10}$")
+# Message shown instead of the car details when the lookup finds nothing.
+# Only text after the "Find car" button and outside the footer is looked at,
+# so a banner or link elsewhere on the page is not taken for the result.
+VEHICLE_NOT_FOUND_XPATH = "//button[text()=\"Find car\"]/following::*[not(ancestor::footer)]" \
+    "[contains(text(), \"couldn't find\") or contains(text(), \"could not find\") or contains(text(), \"not found\")]"
+
+# Cookies that keep the cookie banner away and the quote session going. Only
+# they decide whether a session snapshot is still valid, analytics cookies
+# come and go without the banner being shown again.
+CONSENT_COOKIE_PATTERN = re.compile(r"^_evidon_consent")
+SESSION_COOKIE_PATTERN = re.compile(r"session", re.IGNORECASE)
+
+class VehicleNotFoundError(Exception):
+    def __init__(self, registration):
+        self.registration = registration
+        super().__init__(f"No vehicle found for registration '{registration}'")
+
+class PriceParseError(Exception):
+    def __init__(self, price):
+        self.price = price
+        super().__init__(f"Could not parse the price '{price}'")
+
+def parse_price(price):
+    # prices are formatted for display on the page, e.g. '€1,512.34'
+    if isinstance(price, (int, float)):
+        return float(price)
+    try:
+        return float(str(price).strip().lstrip("€").replace(",", ""))
+    except ValueError:
+        raise PriceParseError(price)
+
+class FormFillError(Exception):
+    def __init__(self, page, failed_fields):
+        self.page = page
+        self.failed_fields = failed_fields
+        super().__init__(f"Failed to fill in {len(failed_fields)} field(s) on page '{page}': {failed_fields}")
 
 class Quote:
     def __init__(self, registration, car_name, reference_id, price):
@@ -61,9 +259,66 @@ class Quote:
         
     def __str__(self):
         return f"Ref ID: {self.reference_id:10}, Registration: {self.registration:10}, Quote: €{self.price:7.2f}, Car name: {self.car_name}"
-    
+
+class Profile:
+    # The answers about the driver given on the form
+    FIELDS = ("annual_distance", "first_name", "last_name", "date_of_birth", "phone_number", "email", "occupation", "eir_code", "license_held")
+
+    def __init__(self, name, annual_distance, first_name, last_name, date_of_birth, phone_number, email, occupation, eir_code, license_held):
+        self.name = name
+        self.annual_distance = annual_distance
+        self.first_name = first_name
+        self.last_name = last_name
+        self.date_of_birth = date_of_birth
+        self.phone_number = phone_number
+        self.email = email
+        self.occupation = occupation
+        self.eir_code = eir_code
+        self.license_held = license_held
+    def get_hash(self):
+        # Identifies the answers given on the form, quotes are only comparable
+        # when they were got with the same profile
+        profile = [getattr(self, field) for field in self.FIELDS]
+        return hashlib.sha256(json.dumps(profile).encode()).hexdigest()[:16]
+    def __str__(self):
+        return f"{self.name} ({self.date_of_birth}, {self.license_held}, {self.annual_distance}, {self.eir_code}, {self.occupation})"
+
+class QuoteJob:
+    def __init__(self, profile, registration):
+        self._profile = profile
+        self._registration = registration
+
+    @property
+    def profile(self):
+        return self._profile
+
+    @property
+    def registration(self):
+        return self._registration
+
+    @property
+    def key(self):
+        # the same registration is quoted once per distinct set of answers
+        return f"{self.profile.get_hash()}:{normalize_registration(self.registration)}"
+
+    def __str__(self):
+        return f"Profile: {self.profile.name}, Registration: {self.registration}"
+
+def normalize_registration(registration):
+    return registration.replace(" ", "").replace("-", "").upper()
+
 class Config:
-    def __init__(self, annual_distance, first_name, last_name, date_of_birth, phone_number, email, occupation, eir_code, license_held, registrations):
+    def __init__(self, annual_distance, first_name, last_name, date_of_birth, phone_number, email, occupation, eir_code, license_held, registrations,
+            workers=1, driver_max_uses=20, driver_max_rss_mb=0, engine="selenium",
+            fill_mode="sequential", trace_file="", lean_browser=False, page_load_strategy="normal", browser_network_stats=False,
+            blocked_resource_types=("image", "media", "font"), blocked_domains=(), history_file="", quote_ttl_seconds=0,
+            vehicle_cache_ttl_seconds=30*24*60*60, vehicle_not_found_ttl_seconds=24*60*60, vehicle_cache_size=1000,
+            entry_mode="homepage", quote_form_url="/car-insurance/get-a-quote/", session_snapshot_file="",
+            retries=3, retry_sleep_seconds=60, retry_max_sleep_seconds=600, circuit_breaker_threshold=5, circuit_breaker_cooldown_seconds=900,
+            base_url=DEFAULT_BASE_URL, chromedriver_path="/usr/local/bin/chromedriver", chromedriver_auto_install=False, warm_up_browsers=False,
+            profiles=None, quote_pairs=(), shard_index=0, shard_count=1,
+            monitor_interval_seconds=8*60*60, min_monitor_interval_seconds=2*60*60, max_monitor_interval_seconds=24*60*60,
+            config_reload_interval_seconds=30, resource_sample_interval_seconds=15, profiling_endpoints=False):
         self.annual_distance = annual_distance
         self.first_name = first_name
         self.last_name = last_name
@@ -74,6 +329,61 @@ class Config:
         self.eir_code = eir_code
         self.license_held = license_held
         self.registrations = registrations
+        self.workers = workers
+        self.driver_max_uses = driver_max_uses
+        self.driver_max_rss_mb = driver_max_rss_mb
+        self.engine = engine
+        self.fill_mode = fill_mode
+        self.trace_file = trace_file
+        self.lean_browser = lean_browser
+        self.page_load_strategy = page_load_strategy
+        self.browser_network_stats = browser_network_stats
+        self.blocked_resource_types = list(blocked_resource_types)
+        self.blocked_domains = list(blocked_domains)
+        self.history_file = history_file
+        self.quote_ttl_seconds = quote_ttl_seconds
+        self.vehicle_cache_ttl_seconds = vehicle_cache_ttl_seconds
+        self.vehicle_not_found_ttl_seconds = vehicle_not_found_ttl_seconds
+        self.vehicle_cache_size = vehicle_cache_size
+        self.entry_mode = entry_mode
+        self.quote_form_url = quote_form_url
+        self.session_snapshot_file = session_snapshot_file
+        self.retries = retries
+        self.retry_sleep_seconds = retry_sleep_seconds
+        self.retry_max_sleep_seconds = retry_max_sleep_seconds
+        self.circuit_breaker_threshold = circuit_breaker_threshold
+        self.circuit_breaker_cooldown_seconds = circuit_breaker_cooldown_seconds
+        self.base_url = base_url
+        self.chromedriver_path = chromedriver_path
+        self.chromedriver_auto_install = chromedriver_auto_install
+        self.warm_up_browsers = warm_up_browsers
+        # the answers above are the profile used if no profiles are given
+        self.profile_name = "default"
+        self.profiles = list(profiles) if profiles else [self.get_profile()]
+        # (profile name, registration) quoted on top of every profile and registration pair
+        self.quote_pairs = list(quote_pairs)
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.monitor_interval_seconds = monitor_interval_seconds
+        self.min_monitor_interval_seconds = min_monitor_interval_seconds
+        self.max_monitor_interval_seconds = max_monitor_interval_seconds
+        self.config_reload_interval_seconds = config_reload_interval_seconds
+        self.resource_sample_interval_seconds = resource_sample_interval_seconds
+        self.profiling_endpoints = profiling_endpoints
+    def get_quote_form_url(self):
+        # relative to the base URL unless it is an absolute URL
+        return urljoin(self.base_url, self.quote_form_url)
+    def get_profile(self):
+        return Profile(self.profile_name, *[getattr(self, field) for field in Profile.FIELDS])
+    def get_profile_hash(self):
+        return self.get_profile().get_hash()
+    def for_profile(self, profile):
+        # Copy of the config answering the form with the given profile
+        config = copy.copy(self)
+        config.profile_name = profile.name
+        for field in Profile.FIELDS:
+            setattr(config, field, getattr(profile, field))
+        return config
     def __str__(self):
         return "Annual Distance: " + self.annual_distance + "\n" + \
                 "First Name: " + self.first_name + "\n" + \
@@ -83,18 +393,1117 @@ class Config:
                 "Email: " + self.email + "\n" + \
                 "Occupation: " + self.occupation + "\n" + \
                 "EIR Code: " + self.eir_code + "\n" + \
-                "License Held: " + self.license_held + "\n"
+                "License Held: " + self.license_held + "\n" + \
+                "Workers: " + str(self.workers) + "\n" + \
+                "Driver Max Uses: " + str(self.driver_max_uses) + "\n" + \
+                "Driver Max RSS (MB): " + str(self.driver_max_rss_mb) + "\n" + \
+                "Engine: " + self.engine + "\n" + \
+                "Fill Mode: " + self.fill_mode + "\n" + \
+                "Trace File: " + self.trace_file + "\n" + \
+                "Lean Browser: " + str(self.lean_browser) + "\n" + \
+                "Page Load Strategy: " + self.page_load_strategy + "\n" + \
+                "Browser Network Stats: " + str(self.browser_network_stats) + "\n" + \
+                "Blocked Resource Types: " + ", ".join(self.blocked_resource_types) + "\n" + \
+                "Blocked Domains: " + ", ".join(self.blocked_domains) + "\n" + \
+                "History File: " + self.history_file + "\n" + \
+                "Quote TTL (seconds): " + str(self.quote_ttl_seconds) + "\n" + \
+                "Vehicle Cache TTL (seconds): " + str(self.vehicle_cache_ttl_seconds) + "\n" + \
+                "Vehicle Not Found TTL (seconds): " + str(self.vehicle_not_found_ttl_seconds) + "\n" + \
+                "Vehicle Cache Size: " + str(self.vehicle_cache_size) + "\n" + \
+                "Entry Mode: " + self.entry_mode + "\n" + \
+                "Quote Form URL: " + self.quote_form_url + "\n" + \
+                "Session Snapshot File: " + self.session_snapshot_file + "\n" + \
+                "Retries: " + str(self.retries) + "\n" + \
+                "Retry Sleep (seconds): " + str(self.retry_sleep_seconds) + "\n" + \
+                "Retry Max Sleep (seconds): " + str(self.retry_max_sleep_seconds) + "\n" + \
+                "Circuit Breaker Threshold: " + str(self.circuit_breaker_threshold) + "\n" + \
+                "Circuit Breaker Cooldown (seconds): " + str(self.circuit_breaker_cooldown_seconds) + "\n" + \
+                "Base URL: " + self.base_url + "\n" + \
+                "Chromedriver Path: " + self.chromedriver_path + "\n" + \
+                "Chromedriver Auto Install: " + str(self.chromedriver_auto_install) + "\n" + \
+                "Warm Up Browsers: " + str(self.warm_up_browsers) + "\n" + \
+                "Profiles: " + "; ".join(str(profile) for profile in self.profiles) + "\n" + \
+                "Quote Pairs: " + ", ".join(f"{profile_name}/{registration}" for profile_name, registration in self.quote_pairs) + "\n" + \
+                "Shard: " + str(self.shard_index) + " of " + str(self.shard_count) + "\n" + \
+                "Monitor Interval (seconds): " + str(self.monitor_interval_seconds) + "\n" + \
+                "Min Monitor Interval (seconds): " + str(self.min_monitor_interval_seconds) + "\n" + \
+                "Max Monitor Interval (seconds): " + str(self.max_monitor_interval_seconds) + "\n" + \
+                "Config Reload Interval (seconds): " + str(self.config_reload_interval_seconds) + "\n" + \
+                "Resource Sample Interval (seconds): " + str(self.resource_sample_interval_seconds) + "\n" + \
+                "Profiling Endpoints: " + str(self.profiling_endpoints) + "\n"
+
+def plan_quote_jobs(config):
+    # Every profile with every registration, then the explicit pairs, with
+    # the same registration for the same answers only quoted once
+    profiles = {profile.name: profile for profile in config.profiles}
+    pairs = [(profile, registration) for profile in config.profiles for registration in config.registrations]
+    pairs += [(profiles[profile_name], registration) for profile_name, registration in config.quote_pairs]
+    jobs = OrderedDict()
+    for profile, registration in pairs:
+        job = QuoteJob(profile, registration)
+        jobs.setdefault(job.key, job)
+    return list(jobs.values())
+
+def get_shard_jobs(jobs, shard_index, shard_count):
+    # Jobs are split by a hash of their key, so every replica works out its
+    # own share without talking to the others
+    return [job for job in jobs
+        if int(hashlib.sha256(job.key.encode()).hexdigest(), 16) % shard_count == shard_index]
+
+def _get_process_tree(pid):
+    # A process and all its descendants, read from /proc
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat:
+                # the process name can contain spaces, fields start after the last ')'
+                parents[int(entry)] = int(stat.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(child for child, parent in parents.items() if parent == current)
+    return tree
+
+def _get_process_tree_rss_bytes(pid):
+    # Sum of the RSS of a process and all its descendants, so chromedriver
+    # and every Chrome process it spawned are accounted for
+    try:
+        rss_pages = 0
+        for tree_pid in _get_process_tree(pid):
+            try:
+                with open(f"/proc/{tree_pid}/statm") as statm:
+                    rss_pages += int(statm.read().split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+        return rss_pages * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
+
+def _get_process_start_time():
+    # When this process started in seconds since the epoch, read from /proc
+    # so the time spent importing modules is accounted for
+    try:
+        with open("/proc/self/stat") as stat:
+            start_ticks = int(stat.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat") as stat:
+            boot_time = next(int(line.split()[1]) for line in stat if line.startswith("btime"))
+        return boot_time + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError, StopIteration):
+        return None
+
+def _import_selenium():
+    # Importing the WebDriver modules takes a while, so it is left until the
+    # metrics server is up and only done if the selenium engine is used
+    global Chrome, ChromeOptions, By, WebDriverWait, EC, Select, Service
+    from selenium.webdriver import Chrome, ChromeOptions
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.select import Select
+    from selenium.webdriver.chrome.service import Service
+
+def resolve_chromedriver_path(path, auto_install, logger):
+    # Resolved once at startup, the pinned binary is used if it is there,
+    # then one on the PATH, and webdriver-manager only if it is allowed to
+    # look up and download a matching version
+    if path and os.access(path, os.X_OK):
+        resolved_path = path
+    elif shutil.which("chromedriver"):
+        resolved_path = shutil.which("chromedriver")
+    elif auto_install:
+        logger.info("No chromedriver found, getting one with webdriver-manager")
+        from webdriver_manager.chrome import ChromeDriverManager
+        resolved_path = ChromeDriverManager(print_first_line=False, log_level=logging.WARNING).install()
+    else:
+        raise FileNotFoundError(f"No chromedriver found at '{path}' or on the PATH, install it or enable chromedriver_auto_install")
+    logger.info(f"Using chromedriver '{resolved_path}'")
+    return resolved_path
+
+# Settings only read on startup, changing them needs a restart
+RESTART_REQUIRED_KEYS = ("workers", "driver_max_uses", "driver_max_rss_mb", "engine", "base_url", "trace_file",
+    "lean_browser", "page_load_strategy", "browser_network_stats", "blocked_resource_types", "blocked_domains", "history_file",
+    "vehicle_cache_ttl_seconds", "vehicle_not_found_ttl_seconds", "vehicle_cache_size", "entry_mode", "session_snapshot_file", "retry_max_sleep_seconds",
+    "circuit_breaker_threshold", "circuit_breaker_cooldown_seconds", "chromedriver_path", "chromedriver_auto_install",
+    "warm_up_browsers", "config_reload_interval_seconds", "resource_sample_interval_seconds", "profiling_endpoints")
+
+# Errors that happen again when retrying straight away
+PERMANENT_ERROR_CLASSES = ("vehicle_not_found", "price_parse")
+
+def classify_error(e):
+    if isinstance(e, VehicleNotFoundError):
+        return "vehicle_not_found"
+    if isinstance(e, PriceParseError):
+        return "price_parse"
+    if isinstance(e, (TimeoutException, requests.Timeout, requests.ConnectionError)):
+        return "timeout"
+    if isinstance(e, (NoSuchElementException, FormFillError)):
+        return "missing_element"
+    return "unknown"
+
+class CircuitBreaker:
+    # Shared by every worker. After failure_threshold failed attempts in a
+    # row, no attempts are made until cooldown_seconds have passed. Then a
+    # single attempt is let through as a probe: if it succeeds the breaker
+    # closes again, otherwise it stays open for another cooldown.
+    CLOSED = 0
+    OPEN = 1
+    HALF_OPEN = 2
+    STATE_NAMES = {CLOSED: "closed", OPEN: "open", HALF_OPEN: "half-open"}
+
+    def __init__(self, logger, failure_threshold=5, cooldown_seconds=900):
+        self._logger = logger
+        self._failure_threshold = failure_threshold
+        self._cooldown_seconds = cooldown_seconds
+        self._condition = threading.Condition()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0
+        self._stopped = False
+        self._state_metric = Gauge("circuit_breaker_state", "State of the circuit breaker, 0 closed, 1 open and 2 half-open")
+
+    @property
+    def logger(self):
+        return self._logger
+
+    @property
+    def state(self):
+        return self._state
+
+    def _set_state(self, state):
+        # the condition must be held
+        if state != self._state:
+            self.logger.warning(f"Circuit breaker is now {self.STATE_NAMES[state]}")
+        self._state = state
+        self._state_metric.set(state)
+        self._condition.notify_all()
+
+    def stop(self):
+        # wakes every worker waiting for the breaker, so they can give up
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def wait_until_closed(self):
+        # Blocks while the breaker is open and returns the time waited, or
+        # straight away once stopped
+        start = perf_counter()
+        with self._condition:
+            while not self._stopped:
+                if self._state == self.CLOSED:
+                    break
+                if self._state == self.OPEN:
+                    remaining = self._opened_at + self._cooldown_seconds - time()
+                    if remaining <= 0:
+                        # the caller is the probe
+                        self._set_state(self.HALF_OPEN)
+                        break
+                    self._condition.wait(remaining)
+                else: # a probe is in flight
+                    self._condition.wait()
+        return perf_counter() - start
+
+    def record_success(self):
+        with self._condition:
+            self._consecutive_failures = 0
+            self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        with self._condition:
+            self._consecutive_failures += 1
+            if self._state == self.HALF_OPEN or \
+                    (self._failure_threshold and self._consecutive_failures >= self._failure_threshold):
+                self._opened_at = time()
+                self._set_state(self.OPEN)
+
+class QuoteScheduler:
+    # Every job has its own due time in a priority queue, and jobs are spread
+    # evenly across the interval to begin with, so only as many quotes as
+    # there are workers run at once however many jobs there are. A job's
+    # interval is halved when its price changes and grows while it does not,
+    # within min_interval_seconds and max_interval_seconds.
+    SPEED_UP_FACTOR = 0.5
+    BACK_OFF_FACTOR = 1.5
+
+    def __init__(self, logger, get_quote, workers=1, interval_seconds=8*60*60, min_interval_seconds=2*60*60, max_interval_seconds=24*60*60):
+        self._logger = logger
+        self._get_quote = get_quote
+        self._workers = workers
+        self._interval_seconds = interval_seconds
+        self._min_interval_seconds = min_interval_seconds
+        self._max_interval_seconds = max_interval_seconds
+        self._condition = threading.Condition()
+        self._queue = []
+        self._jobs = {}
+        self._sequence = 0
+        self._running = 0
+        self._stopped = False
+        self._queue_depth_metric = Gauge("scheduler_queue_depth", "Quote jobs past their due time waiting for a worker")
+        self._queue_depth_metric.set_function(self.get_queue_depth)
+        self._lag_metric = Histogram("scheduler_lag_seconds", "Time quote jobs started after their due time",
+            buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, float("inf")))
+        self._interval_metric = Gauge("quote_interval_seconds", "Effective interval between quotes", ['profile', 'registration'])
+
+    @property
+    def logger(self):
+        return self._logger
+
+    def get_queue_depth(self):
+        now = time()
+        with self._condition:
+            return sum(1 for due_time, sequence, key in self._queue
+                if due_time <= now and self._jobs.get(key, {}).get("version") == sequence)
+
+    def has_job(self, job):
+        with self._condition:
+            return self._jobs.get(job.key, {}).get("job") is job
+
+    def schedule_evenly(self, jobs):
+        now = time()
+        for index, job in enumerate(jobs):
+            self.schedule(job, now + index * self._interval_seconds / len(jobs))
+
+    def schedule(self, job, due_time):
+        with self._condition:
+            entry = self._jobs.get(job.key)
+            if entry is None:
+                entry = {"job": job, "interval": self._get_bounded_interval(self._interval_seconds), "price": None, "version": None}
+                self._jobs[job.key] = entry
+                self._interval_metric.labels(profile=job.profile.name, registration=job.registration).set(entry["interval"])
+            self._push(job.key, entry, due_time)
+
+    def remove(self, job):
+        # a running quote of the job finishes but it is not scheduled again
+        with self._condition:
+            if self._jobs.get(job.key, {}).get("job") is not job:
+                return
+            del self._jobs[job.key]
+        try:
+            self._interval_metric.remove(job.profile.name, job.registration)
+        except KeyError:
+            pass
+
+    def set_intervals(self, interval_seconds, min_interval_seconds, max_interval_seconds):
+        with self._condition:
+            self._interval_seconds = interval_seconds
+            self._min_interval_seconds = min_interval_seconds
+            self._max_interval_seconds = max_interval_seconds
+            for entry in self._jobs.values():
+                entry["interval"] = self._get_bounded_interval(entry["interval"])
+                job = entry["job"]
+                self._interval_metric.labels(profile=job.profile.name, registration=job.registration).set(entry["interval"])
+
+    def run_forever(self):
+        # Returns once stopped, without waiting for the quotes still running
+        executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="quote-worker")
+        try:
+            while True:
+                popped = self._pop_due()
+                if popped is None:
+                    break
+                entry, due_time = popped
+                self._lag_metric.observe(max(0, time() - due_time))
+                executor.submit(self._run, entry, due_time)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def _push(self, key, entry, due_time):
+        # The condition must be held. Entries left in the queue from before
+        # the job was rescheduled or removed are skipped.
+        self._sequence += 1
+        entry["version"] = self._sequence
+        heapq.heappush(self._queue, (due_time, self._sequence, key))
+        self._condition.notify_all()
+
+    def _pop_due(self):
+        # Waits for a free worker and a due job, returns None once stopped
+        with self._condition:
+            while not self._stopped:
+                if self._running >= self._workers or not self._queue:
+                    self._condition.wait()
+                    continue
+                due_time, sequence, key = self._queue[0]
+                entry = self._jobs.get(key)
+                if entry is None or entry["version"] != sequence:
+                    heapq.heappop(self._queue)
+                    continue
+                remaining = due_time - time()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                heapq.heappop(self._queue)
+                self._running += 1
+                return (entry, due_time)
+            return None
+
+    def _run(self, entry, due_time):
+        job = entry["job"]
+        quote = None
+        try:
+            quote = self._get_quote(job)
+        except Exception as e:
+            self.logger.exception(e)
+        finally:
+            with self._condition:
+                self._running -= 1
+                self._condition.notify_all()
+            self._reschedule(entry, due_time, quote)
+
+    def _reschedule(self, entry, due_time, quote):
+        job = entry["job"]
+        with self._condition:
+            if self._jobs.get(job.key) is not entry:
+                return
+            if quote is not None:
+                if entry["price"] is not None and round(quote.price, 2) != round(entry["price"], 2):
+                    entry["interval"] = self._get_bounded_interval(entry["interval"] * self.SPEED_UP_FACTOR)
+                    self.logger.info(f"Price changed for {job}, polling every {self._get_formatted_time(int(entry['interval']))}")
+                elif entry["price"] is not None:
+                    entry["interval"] = self._get_bounded_interval(entry["interval"] * self.BACK_OFF_FACTOR)
+                entry["price"] = quote.price
+            self._interval_metric.labels(profile=job.profile.name, registration=job.registration).set(entry["interval"])
+            # keep to the spread out due times unless the job is running late
+            self._push(job.key, entry, max(time(), due_time + entry["interval"]))
+
+    def _get_bounded_interval(self, interval):
+        return min(self._max_interval_seconds, max(self._min_interval_seconds, interval))
+
+    def _get_formatted_time(self, time_in_seconds):
+        return f"{timedelta(seconds=time_in_seconds)} (hh:mm:ss)"
+
+class Tracer:
+    # Records how long each step of getting a quote takes in a histogram and,
+    # if a trace file is given, as complete events in the Chrome trace event
+    # format. The closing ']' is optional in that format, so events can be
+    # appended as they finish and the file opened in chrome://tracing or Perfetto.
+    def __init__(self, logger, trace_file=""):
+        self._logger = logger
+        self._lock = threading.Lock()
+        self._step_latency = Histogram("quote_step_duration_seconds", "Time taken by each step of getting a quote", ['step', 'outcome'],
+            buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 30, 45, 60, float("inf")))
+        self._trace_file = None
+        if trace_file:
+            is_new_file = not os.path.exists(trace_file) or os.path.getsize(trace_file) == 0
+            self._trace_file = open(trace_file, "a", buffering=1)
+            if is_new_file:
+                self._trace_file.write("[\n")
+            self._logger.info(f"Writing trace events to '{trace_file}'")
+
+    @property
+    def step_latency(self):
+        return self._step_latency
+
+    @contextmanager
+    def span(self, name, **args):
+        start_timestamp = time()
+        start = perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            args["error"] = type(e).__name__
+            raise
+        finally:
+            self._write_event(name, start_timestamp, perf_counter() - start, args)
+
+    @contextmanager
+    def step(self, name, **args):
+        start = perf_counter()
+        outcome = "success"
+        try:
+            with self.span(name, **args):
+                yield
+        except BaseException as e:
+            outcome = "failure"
+            # remember the innermost step that failed for the failure metrics
+            if getattr(e, "quote_step", None) is None:
+                try:
+                    e.quote_step = name
+                except AttributeError:
+                    pass
+            raise
+        finally:
+            self._step_latency.labels(step=name, outcome=outcome).observe(perf_counter() - start)
+
+    def _write_event(self, name, start_timestamp, duration, args):
+        if self._trace_file is None:
+            return
+        event = {
+            "name": name,
+            "cat": "quote",
+            "ph": "X",
+            "ts": int(start_timestamp*1_000_000),
+            "dur": int(duration*1_000_000),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args,
+        }
+        with self._lock:
+            self._trace_file.write(json.dumps(event) + ",\n")
+
+    def close(self):
+        with self._lock:
+            if self._trace_file is not None:
+                self._trace_file.close()
+                self._trace_file = None
+
+class QuoteStore:
+    HISTORY_FIELDS = ["timestamp", "profile_hash", "registration", "car_name", "reference_id", "price"]
+
+    def __init__(self, path, logger):
+        self._logger = logger
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # shared by the workers, access is serialised with the lock
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("""CREATE TABLE IF NOT EXISTS quotes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp REAL NOT NULL,
+                profile_hash TEXT NOT NULL,
+                registration TEXT NOT NULL,
+                car_name TEXT,
+                reference_id TEXT,
+                price REAL NOT NULL)""")
+            # latest quote per registration and range queries over time
+            self._connection.execute("CREATE INDEX IF NOT EXISTS quotes_registration_profile_timestamp ON quotes (registration, profile_hash, timestamp)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS quotes_timestamp ON quotes (timestamp)")
+            # registrations are stored normalized, older rows kept them as given
+            self._connection.execute("UPDATE quotes SET registration = REPLACE(REPLACE(UPPER(registration), ' ', ''), '-', '') "
+                "WHERE registration != REPLACE(REPLACE(UPPER(registration), ' ', ''), '-', '')")
+        self._logger.info(f"Using quote history store '{path}'")
+
+    @property
+    def logger(self):
+        return self._logger
+
+    def add(self, quote, profile_hash, timestamp=None):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO quotes (timestamp, profile_hash, registration, car_name, reference_id, price) VALUES (?, ?, ?, ?, ?, ?)",
+                (timestamp or time(), profile_hash, normalize_registration(quote.registration), quote.car_name, quote.reference_id, quote.price))
+
+    def get_latest(self, registration, profile_hash):
+        # returns (timestamp, quote) of the latest quote or None
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT timestamp, registration, car_name, reference_id, price FROM quotes "
+                "WHERE registration = ? AND profile_hash = ? ORDER BY timestamp DESC LIMIT 1",
+                (normalize_registration(registration), profile_hash)).fetchone()
+        if row is None:
+            return None
+        return (row[0], Quote(*row[1:]))
+
+    def get_latest_quotes(self, profile_hash):
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT q.timestamp, q.registration, q.car_name, q.reference_id, q.price FROM quotes q "
+                "JOIN (SELECT registration, MAX(timestamp) AS timestamp FROM quotes WHERE profile_hash = ? GROUP BY registration) latest "
+                "ON q.registration = latest.registration AND q.timestamp = latest.timestamp WHERE q.profile_hash = ?",
+                (profile_hash, profile_hash)).fetchall()
+        return [(row[0], Quote(*row[1:])) for row in rows]
+
+    def get_history(self, registration=None, start=None, end=None):
+        # Yields rows as dicts oldest first, reading from the database in
+        # batches so large histories are never held in memory at once
+        query = f"SELECT {', '.join(self.HISTORY_FIELDS)} FROM quotes WHERE 1 = 1"
+        parameters = []
+        if registration is not None:
+            query += " AND registration = ?"
+            parameters.append(normalize_registration(registration))
+        if start is not None:
+            query += " AND timestamp >= ?"
+            parameters.append(start)
+        if end is not None:
+            query += " AND timestamp < ?"
+            parameters.append(end)
+        query += " ORDER BY timestamp"
+        with self._lock:
+            cursor = self._connection.execute(query, parameters)
+            rows = cursor.fetchmany(1000)
+        while rows:
+            for row in rows:
+                yield dict(zip(self.HISTORY_FIELDS, row))
+            with self._lock:
+                rows = cursor.fetchmany(1000)
+
+    def export(self, stream, export_format="jsonl", **filters):
+        count = 0
+        if export_format == "csv":
+            writer = csv.DictWriter(stream, fieldnames=self.HISTORY_FIELDS)
+            writer.writeheader()
+            for row in self.get_history(**filters):
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in self.get_history(**filters):
+                stream.write(json.dumps(row) + "\n")
+                count += 1
+        return count
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+class VehicleCache:
+    # Registration to car name lookups, least recently used entries are
+    # evicted once there are more than max_size. Registrations the lookup
+    # found nothing for are kept too (with no car name) so they can be
+    # rejected without getting a quote, for not_found_ttl_seconds only as a
+    # new car may be registered or the lookup may have failed for a while.
+    # Entries are keyed by the normalized registration, so '11-L-80085' and
+    # '11L80085' share one.
+    def __init__(self, path, logger, ttl_seconds=30*24*60*60, not_found_ttl_seconds=24*60*60, max_size=1000):
+        self._logger = logger
+        self._ttl_seconds = ttl_seconds
+        self._not_found_ttl_seconds = not_found_ttl_seconds
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._hits = Counter("vehicle_cache_hits", "Vehicle lookups found in the cache")
+        self._misses = Counter("vehicle_cache_misses", "Vehicle lookups not found in the cache")
+        self._invalidations = Counter("vehicle_cache_invalidations", "Cached vehicle lookups that no longer matched the website")
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("""CREATE TABLE IF NOT EXISTS vehicles (
+                registration TEXT PRIMARY KEY,
+                car_name TEXT,
+                looked_up_at REAL NOT NULL)""")
+            self._connection.execute("UPDATE OR REPLACE vehicles SET registration = REPLACE(REPLACE(UPPER(registration), ' ', ''), '-', '') "
+                "WHERE registration != REPLACE(REPLACE(UPPER(registration), ' ', ''), '-', '')")
+            rows = self._connection.execute(
+                "SELECT registration, car_name, looked_up_at FROM vehicles ORDER BY looked_up_at DESC LIMIT ?",
+                (max_size,)).fetchall()
+        for registration, car_name, looked_up_at in reversed(rows):
+            self._entries[registration] = (car_name, looked_up_at)
+
+    @property
+    def logger(self):
+        return self._logger
+
+    def _get_entry(self, registration):
+        registration = normalize_registration(registration)
+        with self._lock:
+            entry = self._entries.get(registration)
+            if entry is None:
+                return None
+            ttl_seconds = self._ttl_seconds if entry[0] is not None else self._not_found_ttl_seconds
+            if time() - entry[1] >= ttl_seconds:
+                self._remove(registration)
+                return None
+            self._entries.move_to_end(registration)
+            return entry
+
+    def get(self, registration):
+        entry = self._get_entry(registration)
+        if entry is None or entry[0] is None:
+            self._misses.inc()
+            return None
+        self._hits.inc()
+        return entry[0]
+
+    def is_invalid(self, registration):
+        entry = self._get_entry(registration)
+        return entry is not None and entry[0] is None
+
+    def put(self, registration, car_name):
+        registration = normalize_registration(registration)
+        looked_up_at = time()
+        with self._lock:
+            self._entries[registration] = (car_name, looked_up_at)
+            self._entries.move_to_end(registration)
+            with self._connection:
+                self._connection.execute("INSERT OR REPLACE INTO vehicles (registration, car_name, looked_up_at) VALUES (?, ?, ?)",
+                    (registration, car_name, looked_up_at))
+            while len(self._entries) > self._max_size:
+                self._remove(next(iter(self._entries)))
+
+    def put_invalid(self, registration):
+        self.put(registration, None)
+
+    def confirm(self, registration, car_name):
+        # Checks what the website shows against the cached lookup
+        cached_car_name = self.get(registration)
+        if cached_car_name is not None and cached_car_name != car_name:
+            self.logger.info(f"Vehicle for registration '{registration}' changed from '{cached_car_name}' to '{car_name}'")
+            self._invalidations.inc()
+        if cached_car_name != car_name:
+            self.put(registration, car_name)
+
+    def _remove(self, registration):
+        # the lock must be held
+        self._entries.pop(registration, None)
+        with self._connection:
+            self._connection.execute("DELETE FROM vehicles WHERE registration = ?", (registration,))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+class SessionSnapshot:
+    # Consent and session cookies of a browser that got a quote. They are
+    # injected into new browsers before the first page load so the cookie
+    # banner is not shown again.
+    def __init__(self, logger, path=""):
+        self._logger = logger
+        self._path = path
+        self._lock = threading.Lock()
+        self._cookies = None
+        if path and os.path.exists(path):
+            try:
+                with open(path) as stream:
+                    self._cookies = json.load(stream)
+                self._logger.info(f"Loaded session snapshot with {len(self._cookies)} cookie(s) from '{path}'")
+            except (OSError, ValueError) as e:
+                self._logger.warning(f"Could not load session snapshot from '{path}': {e}")
+
+    @property
+    def logger(self):
+        return self._logger
+
+    def is_valid(self):
+        with self._lock:
+            cookies = self._cookies or []
+        consent_cookies = [cookie for cookie in cookies if CONSENT_COOKIE_PATTERN.search(cookie["name"])]
+        session_cookies = [cookie for cookie in cookies if SESSION_COOKIE_PATTERN.search(cookie["name"])]
+        if not consent_cookies:
+            return False
+        # an expired consent or session cookie means they would be asked for again
+        now = time()
+        return all(cookie.get("expires", now + 1) > now for cookie in consent_cookies + session_cookies)
+
+    def save(self, driver):
+        cookies = [{key: cookie[key] for key in ("name", "value", "domain", "path", "secure", "httpOnly", "expires", "sameSite") if key in cookie}
+            for cookie in driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]]
+        # session cookies have a negative expiry in the DevTools protocol
+        for cookie in cookies:
+            if cookie.get("expires", 0) < 0:
+                del cookie["expires"]
+        with self._lock:
+            self._cookies = cookies
+            if self._path:
+                if os.path.dirname(self._path):
+                    os.makedirs(os.path.dirname(self._path), exist_ok=True)
+                with open(self._path, "w") as stream:
+                    json.dump(cookies, stream)
+        self.logger.info(f"Saved session snapshot with {len(cookies)} cookie(s)")
+
+    def invalidate(self):
+        with self._lock:
+            if self._cookies is None:
+                return
+            self._cookies = None
+            if self._path and os.path.exists(self._path):
+                os.remove(self._path)
+        self.logger.info("Session snapshot is stale, it will be rebuilt after the next quote")
+
+    def inject(self, driver):
+        if not self.is_valid():
+            return
+        now = time()
+        with self._lock:
+            cookies = [cookie for cookie in self._cookies or [] if cookie.get("expires", now + 1) > now]
+        driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+
+class DriverPool:
+    def __init__(self, create_driver, logger, size=1, max_uses=20, max_rss_bytes=0, start_url=DEFAULT_BASE_URL, prepare_driver=None):
+        self._create_driver = create_driver
+        self._prepare_driver = prepare_driver
+        self._logger = logger
+        self._size = size
+        self._max_uses = max_uses
+        self._max_rss_bytes = max_rss_bytes
+        self._start_url = start_url
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._live = {}
+        self._next_browser_id = 0
+        self._closed = False
+        self._pool_size_metric = Gauge("driver_pool_size", "Number of browsers currently running in the driver pool")
+        self._in_use_metric = Gauge("driver_pool_in_use", "Number of browsers currently handed out by the driver pool")
+        self._recycles_metric = Counter("driver_pool_recycles", "Browsers torn down by the driver pool", ['reason'])
+        self._memory_metric = Gauge("driver_memory_bytes", "RSS of each browser including chromedriver and all Chrome processes", ['browser'])
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def logger(self):
+        return self._logger
+
+    @contextmanager
+    def driver(self):
+        # Browsers are only returned to the pool when the block completes
+        # successfully, anything raised inside tears the browser down
+        driver = self.acquire()
+        healthy = False
+        try:
+            yield driver
+            healthy = True
+        finally:
+            self.release(driver, healthy=healthy)
+
+    def acquire(self):
+        self._slots.acquire()
+        try:
+            if self._closed:
+                raise RuntimeError("Driver pool is shut down")
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                driver = self._start_driver()
+        except:
+            self._slots.release()
+            raise
+        self._in_use_metric.inc()
+        return driver
+
+    def release(self, driver, healthy=True):
+        try:
+            self._in_use_metric.dec()
+            if not healthy:
+                self._discard(driver, "failure")
+                return
+            with self._lock:
+                browser = self._live.get(driver)
+                if browser is None: # pool was shut down while the browser was in use
+                    return
+                browser["uses"] += 1
+                uses = browser["uses"]
+            rss = self._update_memory(driver)
+            if self._max_uses and uses >= self._max_uses:
+                self._discard(driver, "max_uses")
+            elif self._max_rss_bytes and rss >= self._max_rss_bytes:
+                self._discard(driver, "max_rss")
+            else:
+                try:
+                    self._reset(driver)
+                except Exception as e:
+                    self.logger.warning(f"Failed to reset browser, discarding it: {e}")
+                    self._discard(driver, "failure")
+                    return
+                with self._lock:
+                    if not self._closed:
+                        self._idle.put(driver)
+                        return
+                # pool was shut down while the browser was being reset
+                self._discard(driver, "shutdown")
+        finally:
+            self._slots.release()
+
+    def get_memory_usage(self):
+        # RSS of every running browser by browser ID
+        with self._lock:
+            browsers = [(driver, browser["id"]) for driver, browser in self._live.items()]
+        return {browser_id: _get_process_tree_rss_bytes(driver.service.process.pid) for driver, browser_id in browsers}
+
+    def warm_up(self):
+        # Start every browser up front, in parallel, so the first quotes do
+        # not wait for them. Browsers that fail to start are started on use.
+        self.logger.info(f"Warming up {self.size} browser(s)")
+        with ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="warm-up") as executor:
+            futures = [executor.submit(self._start_driver) for _ in range(self.size)]
+            for future in futures:
+                try:
+                    self._idle.put(future.result())
+                except Exception as e:
+                    self.logger.warning(f"Failed to start browser while warming up: {e}")
+        self.logger.info(f"Done warming up, {self._idle.qsize()} browser(s) ready")
+
+    def shutdown(self):
+        # Browsers in use are torn down too, and any browser released or
+        # started afterwards is quit rather than pooled
+        self.logger.info("Shutting down driver pool")
+        with self._lock:
+            self._closed = True
+            drivers = list(self._live)
+        for driver in drivers:
+            self._discard(driver, "shutdown")
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+
+    def _start_driver(self):
+        driver = self._create_driver()
+        try:
+            if self._prepare_driver is not None:
+                self._prepare_driver(driver)
+            driver.get(self._start_url)
+        except:
+            driver.quit()
+            raise
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._next_browser_id += 1
+                self._live[driver] = {"id": str(self._next_browser_id), "uses": 0}
+        if closed:
+            # pool was shut down while the browser was starting
+            driver.quit()
+            raise RuntimeError("Driver pool is shut down")
+        self._pool_size_metric.inc()
+        self._update_memory(driver)
+        return driver
+
+    def _reset(self, driver):
+        # Leave no state behind for the next quote
+        try:
+            driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+        except Exception as e:
+            self.logger.debug(f"Could not clear browser storage: {e}")
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        if self._prepare_driver is not None:
+            self._prepare_driver(driver)
+        driver.get(self._start_url)
+
+    def _update_memory(self, driver):
+        with self._lock:
+            browser = self._live.get(driver)
+        if browser is None:
+            return 0
+        rss = _get_process_tree_rss_bytes(driver.service.process.pid)
+        self._memory_metric.labels(browser=browser["id"]).set(rss)
+        return rss
+
+    def _discard(self, driver, reason):
+        with self._lock:
+            browser = self._live.pop(driver, None)
+        if browser is None:
+            return
+        self.logger.debug(f"Tearing down browser {browser['id']} after {browser['uses']} use(s), reason: '{reason}'")
+        self._recycles_metric.labels(reason=reason).inc()
+        self._pool_size_metric.dec()
+        try:
+            self._memory_metric.remove(browser["id"])
+        except KeyError:
+            pass
+        try:
+            driver.quit()
+        except Exception as e:
+            self.logger.warning(f"Failed to quit browser {browser['id']}: {e}")
+
+class HttpQuoteEngine:
+    # Endpoints the answers of each section of the quote form are posted to,
+    # relative to the base URL. Each call returns the quote ID used by the next.
+    # They and the enum values in the payloads are modelled on the form rather
+    # than captured from the live website, so this engine is experimental and
+    # only known to work against mock_axa.
+    START_PATH = "/api/car-quote/start"
+    VEHICLE_LOOKUP_PATH = "/api/car-quote/vehicle-lookup"
+    VEHICLE_DETAILS_PATH = "/api/car-quote/vehicle-details"
+    PROPOSER_DETAILS_PATH = "/api/car-quote/proposer-details"
+    DRIVING_HISTORY_PATH = "/api/car-quote/driving-history"
+    COVER_DETAILS_PATH = "/api/car-quote/cover-details"
+    QUOTE_PATH = "/api/car-quote/quote"
+    SAVE_QUOTE_PATH = "/api/car-quote/save"
+
+    def __init__(self, logger, tracer, vehicle_cache, base_url=DEFAULT_BASE_URL, pool_size=1, timeout_seconds=30):
+        self._logger = logger
+        self._tracer = tracer
+        self._vehicle_cache = vehicle_cache
+        self._base_url = base_url.rstrip("/")
+        self._timeout_seconds = timeout_seconds
+        # One adapter shared by every quote so TCP/TLS connections are kept
+        # alive and reused, while each quote gets its own cookie jar
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+
+    @property
+    def logger(self):
+        return self._logger
+
+    @property
+    def base_url(self):
+        return self._base_url
+
+    def get_session(self):
+        session = requests.Session()
+        session.mount("https://", self._adapter)
+        session.mount("http://", self._adapter)
+        session.headers.update({
+            "Accept": "application/json",
+            "Origin": self._base_url,
+            "Referer": f"{self._base_url}/car-insurance/",
+        })
+        return session
+
+    def _post(self, session, path, payload):
+        self.logger.debug(f"POST {path}")
+        # steps are named after the endpoint, e.g. 'http_vehicle_lookup'
+        with self._tracer.step("http_" + path.rsplit("/", 1)[1].replace("-", "_")):
+            response = session.post(f"{self._base_url}{path}", json=payload, timeout=self._timeout_seconds)
+            response.raise_for_status()
+            return response.json()
+
+    def _vehicle_lookup(self, session, quote_id, registration):
+        self.logger.debug(f"Looking up vehicle with registration '{registration}'")
+        response = self._post(session, self.VEHICLE_LOOKUP_PATH, {
+            "quoteId": quote_id,
+            "hasRegNumber": True,
+            "vehicleRegistrationNumber": registration,
+        })
+        vehicle = response.get("vehicle")
+        if not vehicle:
+            raise VehicleNotFoundError(registration)
+        self._vehicle_cache.confirm(registration, vehicle["description"])
+        self.logger.debug(f"Done looking up vehicle with registration '{registration}', name '{vehicle['description']}'")
+        return vehicle
+
+    def _vehicle_details(self, session, quote_id, vehicle, annual_distance):
+        self._post(session, self.VEHICLE_DETAILS_PATH, {
+            "quoteId": quote_id,
+            "vehicleId": vehicle["id"],
+            "confirmCar": True,
+            "isVehicleForBusinessUse": False,
+            "isVehicleForCommutingUse": True,
+            "annualDistanceDriven": annual_distance,
+        })
+
+    def _proposer_details(self, session, quote_id, config):
+        self._post(session, self.PROPOSER_DETAILS_PATH, {
+            "quoteId": quote_id,
+            "title": "MR",
+            "firstName": config.first_name,
+            "lastName": config.last_name,
+            "dateOfBirth": config.date_of_birth,
+            "emailAddress": config.email,
+            "phoneNumber": config.phone_number,
+            "employmentStatus": "EMPLOYED",
+            "occupation": config.occupation,
+            "eirCode": config.eir_code,
+            "householdType": "RENTED_ACCOMMODATION",
+        })
+
+    def _driving_history(self, session, quote_id, license_held):
+        self._post(session, self.DRIVING_HISTORY_PATH, {
+            "quoteId": quote_id,
+            "drivingLicenceType": "ROI_PROVISIONAL",
+            "advancedDriverTraining": False,
+            "yearsLicenceHeld": license_held,
+            "hasPenaltyPoints": False,
+            "drivingExperience": "NO_PREVIOUS_INSURANCE",
+        })
+
+    def _cover_details(self, session, quote_id):
+        self._post(session, self.COVER_DETAILS_PATH, {
+            "quoteId": quote_id,
+            "hasMultiProductDiscount": False,
+            "confirmAssumptions": True,
+        })
+
+    def _submit_and_get_quote(self, session, quote_id, registration, car_name):
+        response = self._post(session, self.QUOTE_PATH, {"quoteId": quote_id})
+        return Quote(registration, car_name, response["quoteReferenceId"], parse_price(response["premium"]))
+
+    def get_quote(self, config, registration):
+        self.logger.debug(f"Getting quote over HTTP for registration '{registration}'")
+        # the session is not closed afterwards as that would close the shared adapter
+        session = self.get_session()
+        quote_id = self._post(session, self.START_PATH, {})["quoteId"]
+        vehicle = self._vehicle_lookup(session, quote_id, registration)
+        self._vehicle_details(session, quote_id, vehicle, config.annual_distance)
+        self._proposer_details(session, quote_id, config)
+        self._driving_history(session, quote_id, config.license_held)
+        self._cover_details(session, quote_id)
+        quote = self._submit_and_get_quote(session, quote_id, registration, vehicle["description"])
+        self._post(session, self.SAVE_QUOTE_PATH, {"quoteId": quote_id})
+        self.logger.debug(f"Done getting quote over HTTP for registration '{registration}', retrieved quote: '{quote}'")
+        return quote
+
+class BrowserQuoteEngine:
+    def __init__(self, quote_handler):
+        self._quote_handler = quote_handler
+
+    def get_quote(self, config, registration):
+        # the pool hands out browsers already sitting on the start page
+        with self._quote_handler.driver_pool.driver() as driver:
+            rss = _get_process_tree_rss_bytes(driver.service.process.pid)
+            try:
+                return self._quote_handler.get_quote_with_browser(driver, config, registration)
+            finally:
+                self._quote_handler.collect_network_stats(driver)
+                self._quote_handler.observe_browser_memory_growth(driver, rss)
 
 class QuoteHandler:
-    def __init__(self):
+    def __init__(self, config):
         self._failed_attempts = Counter('failed_attempts', 'Failed attempts')
-        self._registration_metrics = Gauge("quote_prices", "Quote for registrations", ['registration', 'car_name'])
+        self._registration_metrics = Gauge("quote_prices", "Quote for registrations", ['profile', 'registration', 'car_name'])
+        self._shard_jobs = Gauge("quote_jobs", "Quote jobs this replica is responsible for", ['shard'])
         logging.basicConfig(
-            format='%(asctime)s %(levelname)-8s %(message)s',
+            format='%(asctime)s %(levelname)-8s [%(threadName)s] %(message)s',
             level=logging.INFO,
             datefmt='%Y-%m-%d %H:%M:%S')
         self._logger = logging.getLogger(__name__)
         self._logger.level = logging.INFO
+        self._attempt_failures = Counter("quote_attempt_failures", "Failed attempts at getting a quote by the step that failed", ['step'])
+        self._quote_latency = Histogram("quote_duration_seconds", "Time taken to get a quote including retries", ['outcome'],
+            buckets=(5, 10, 20, 30, 45, 60, 90, 120, 180, 300, 600, float("inf")))
+        self._webdriver_commands = Counter("webdriver_commands", "WebDriver commands sent to the browsers", ['command'])
+        self._browser_start_latency = Histogram("browser_start_duration_seconds", "Time taken to start a browser",
+            buckets=(0.25, 0.5, 1, 2, 3, 5, 10, 20, 30, float("inf")))
+        self._blocked_requests = Counter("browser_blocked_requests", "Requests blocked by the lean browser profile", ['resource_type'])
+        self._transferred_bytes = Counter("browser_transferred_bytes", "Bytes transferred over the network by the browsers")
+        self._browser_memory_growth = Histogram("quote_browser_memory_growth_bytes", "Growth of the RSS of the browser used for a quote, including chromedriver and Chrome",
+            buckets=(0, 1<<20, 5<<20, 10<<20, 25<<20, 50<<20, 100<<20, 250<<20, 500<<20, float("inf")))
+        self._retries = Counter("quote_retries", "Failed attempts at getting a quote that are retried, by the class of error", ['error_class'])
+        self._retry_sleep = Counter("retry_sleep_seconds", "Time spent sleeping between attempts", ['reason'])
+        self._time_to_first_quote = Gauge("time_to_first_quote_seconds", "Time from the process starting to the first quote")
+        self._started_at = _get_process_start_time() or time()
+        self._first_quote_lock = threading.Lock()
+        self._got_first_quote = False
+        # set on shutdown, quotes in flight give up instead of retrying
+        self._stopped = threading.Event()
+        self._circuit_breaker = CircuitBreaker(self._logger,
+            failure_threshold=config.circuit_breaker_threshold,
+            cooldown_seconds=config.circuit_breaker_cooldown_seconds)
+        self._retry_max_sleep_seconds = config.retry_max_sleep_seconds
+        self._tracer = Tracer(self._logger, trace_file=config.trace_file)
+        self._browser_config = config
+        self._quote_store = QuoteStore(config.history_file, self._logger) if config.history_file else None
+        # kept next to the quote history, or only in memory if there is none
+        self._vehicle_cache = VehicleCache(config.history_file or ":memory:", self._logger,
+            ttl_seconds=config.vehicle_cache_ttl_seconds, not_found_ttl_seconds=config.vehicle_not_found_ttl_seconds,
+            max_size=config.vehicle_cache_size)
+        self._session_snapshot = SessionSnapshot(self._logger, path=config.session_snapshot_file)
+        self._driver_pool = DriverPool(self.get_driver, self._logger,
+            size=config.workers,
+            max_uses=config.driver_max_uses,
+            max_rss_bytes=config.driver_max_rss_mb*1024*1024,
+            start_url=config.get_quote_form_url() if config.entry_mode == "deep_link" else config.base_url,
+            prepare_driver=self._session_snapshot.inject)
+        # both engines share the get_quote(config, registration) interface
+        if config.engine == "http":
+            self._engine = HttpQuoteEngine(self._logger, self._tracer, self._vehicle_cache, base_url=config.base_url, pool_size=config.workers)
+        else:
+            _import_selenium()
+            self._chromedriver_path = resolve_chromedriver_path(config.chromedriver_path, config.chromedriver_auto_install, self._logger)
+            self._engine = BrowserQuoteEngine(self)
+        # the labels of every quote_prices series, so they can be removed
+        self._price_labels = {}
+        self._price_labels_lock = threading.Lock()
+        self._monitor_config = config
+        self._jobs = []
+        self._reload_lock = threading.Lock()
+        self._scheduler = QuoteScheduler(self._logger, self._run_job,
+            workers=config.workers,
+            interval_seconds=config.monitor_interval_seconds,
+            min_interval_seconds=config.min_monitor_interval_seconds,
+            max_interval_seconds=config.max_monitor_interval_seconds)
         
     @property
     def failed_attempts(self):
@@ -108,24 +1517,110 @@ class QuoteHandler:
     def logger(self):
         return self._logger
 
+    @property
+    def tracer(self):
+        return self._tracer
+
+    @property
+    def circuit_breaker(self):
+        return self._circuit_breaker
+
+    @property
+    def quote_store(self):
+        return self._quote_store
+
+    @property
+    def vehicle_cache(self):
+        return self._vehicle_cache
+
+    @property
+    def session_snapshot(self):
+        return self._session_snapshot
+
+    @property
+    def driver_pool(self):
+        return self._driver_pool
+
+    @property
+    def engine(self):
+        return self._engine
+
+    @property
+    def scheduler(self):
+        return self._scheduler
 
     def wait_for_element(self, driver, wait_time_seconds, by_type, string):
         WebDriverWait(driver, wait_time_seconds).until(EC.presence_of_element_located((by_type, string)))
 
     def get_driver(self):
         self.logger.debug("Getting browser driver")
+        start = perf_counter()
         chrome_options = ChromeOptions()
         chrome_options.add_argument('--headless')
         chrome_options.add_argument('--no-sandbox')
         chrome_options.add_argument('--disable-dev-shm-usage')
         chrome_options.add_argument("--disable-extensions")
-        driver = Chrome(
-            service=Service(ChromeDriverManager(
-                print_first_line=False, log_level=logging.WARNING).install()), 
-            options=chrome_options)
+        chrome_options.page_load_strategy = self._browser_config.page_load_strategy
+        if self._browser_config.lean_browser:
+            for argument in LEAN_BROWSER_ARGUMENTS:
+                chrome_options.add_argument(argument)
+            if "image" in self._browser_config.blocked_resource_types:
+                chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+                chrome_options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+        if self._browser_config.browser_network_stats:
+            # network events are read back from the performance log for the metrics
+            chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        driver = Chrome(service=Service(self._chromedriver_path), options=chrome_options)
+        self._count_webdriver_commands(driver)
+        if self._browser_config.lean_browser:
+            try:
+                self._block_requests(driver)
+            except:
+                driver.quit()
+                raise
+        self._browser_start_latency.observe(perf_counter() - start)
         self.logger.debug("Done getting browser driver")
         return driver
 
+    def _count_webdriver_commands(self, driver):
+        # every WebDriver command is an HTTP round trip to chromedriver
+        execute = driver.execute
+        def counted_execute(driver_command, params=None):
+            self._webdriver_commands.labels(command=driver_command).inc()
+            return execute(driver_command, params)
+        driver.execute = counted_execute
+
+    def _block_requests(self, driver):
+        patterns = [pattern for resource_type in self._browser_config.blocked_resource_types
+            for pattern in BLOCKED_RESOURCE_TYPE_PATTERNS[resource_type]]
+        patterns += [f"*://{domain}/*" for domain in self._browser_config.blocked_domains]
+        patterns += [f"*://*.{domain}/*" for domain in self._browser_config.blocked_domains]
+        self.logger.debug(f"Blocking requests matching {patterns}")
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+
+    def collect_network_stats(self, driver):
+        # Drains the performance log, which would otherwise keep growing
+        if not self._browser_config.browser_network_stats:
+            return
+        try:
+            entries = driver.get_log("performance")
+        except Exception as e:
+            self.logger.debug(f"Could not read the browser performance log: {e}")
+            return
+        for entry in entries:
+            message = json.loads(entry["message"])["message"]
+            if message["method"] == "Network.loadingFailed" and message["params"].get("blockedReason"):
+                self._blocked_requests.labels(resource_type=message["params"].get("type", "Other").lower()).inc()
+            elif message["method"] == "Network.loadingFinished":
+                self._transferred_bytes.inc(message["params"].get("encodedDataLength", 0))
+
+    def observe_browser_memory_growth(self, driver, rss_before):
+        # memory a quote left behind in its browser, shrinking is counted as 0
+        growth = _get_process_tree_rss_bytes(driver.service.process.pid) - rss_before
+        self.logger.debug(f"Browser RSS grew by {growth} bytes during the quote")
+        self._browser_memory_growth.observe(max(0, growth))
+
     def _accept_cookies(self, driver):
         # accept cookies
         try:
@@ -154,82 +1649,39 @@ class QuoteHandler:
         self.wait_for_element(driver, 15, By.ID, "VehicleDetails.VehicleRegistrationNumber")
         driver.find_element(By.ID, "VehicleDetails.VehicleRegistrationNumber").send_keys(registration)
         driver.find_element(By.XPATH, '//button[text()="Find car"]').click()
-        self.wait_for_element(driver, 15, By.ID, "VehicleDetails.ConfirmCarSearchBtn1")
+        WebDriverWait(driver, 15).until(EC.any_of(
+            EC.presence_of_element_located((By.ID, "VehicleDetails.ConfirmCarSearchBtn1")),
+            EC.presence_of_element_located((By.XPATH, VEHICLE_NOT_FOUND_XPATH))))
+        if not driver.find_elements(By.ID, "VehicleDetails.ConfirmCarSearchBtn1"):
+            raise VehicleNotFoundError(registration)
         car_name = driver.find_element(By.XPATH, '//label[text()="Is this the correct car?"]/following-sibling::span/div').text
+        self.vehicle_cache.confirm(registration, car_name)
         driver.find_element(By.XPATH, "//*[@id='VehicleDetails.ConfirmCarSearchBtn1']/..").click()
         self.logger.debug(f"Done confirming car details with registration '{registration}', name '{car_name}'")
         return car_name
 
-    def _business_use_info(self, driver):
-        # For business use or not
-        self.logger.debug("Inputting business use info")
-        self.wait_for_element(driver, 15, By.ID, "VehicleDetails.IsVehicleForBusinessUse2")
-        driver.find_element(By.XPATH, "//*[@id='VehicleDetails.IsVehicleForBusinessUse2']/..").click()
-        self.wait_for_element(driver, 15, By.ID, "VehicleDetails.IsVehicleForCommutingUse1")
-        driver.find_element(By.XPATH, "//*[@id='VehicleDetails.IsVehicleForCommutingUse1']/..").click()
-        self.logger.debug("Done inputting business use info")
-
-    def _annual_distance(self, driver, annual_distance):
-        self.logger.debug(f"Inputting expected annual distance travelled with '{annual_distance}'")
-        self.wait_for_element(driver, 15, By.ID, 'VehicleDetails.AnnualDistanceDrivenTypeId')
-        Select(driver.find_element(By.ID, "VehicleDetails.AnnualDistanceDrivenTypeId")).select_by_visible_text(annual_distance)
-        self.logger.debug(f"Done inputting expected annual distance travelled with '{annual_distance}'")
-
-    def _user_info(self, driver, first_name, last_name, date_of_birth, email, phone_number):
-        # User info
-        self.logger.debug("Inputting user information")
-        self.wait_for_element(driver, 15, By.ID, "ProposerDetails.TitleTypeId1")
-        driver.find_element(By.XPATH, "//*[@id='ProposerDetails.TitleTypeId1']/..").click()
-        driver.find_element(By.ID, "ProposerDetails.FirstName").send_keys(first_name)
-        driver.find_element(By.ID, "ProposerDetails.LastName").send_keys(last_name)
-        driver.find_element(By.ID, "ProposerDetails.DateOfBirth.Day").send_keys(date_of_birth.split('-')[2])
-        driver.find_element(By.ID, "ProposerDetails.DateOfBirth.Month").send_keys(date_of_birth.split('-')[1]) 
-        driver.find_element(By.ID, "ProposerDetails.DateOfBirth.Year").send_keys(date_of_birth.split('-')[0])
-        driver.find_element(By.ID, "ProposerDetails.EmailAddress").send_keys(email)
-        driver.find_element(By.XPATH, "//input[@name='phone-number']").send_keys(phone_number)
-        self.logger.debug("Done inputting user information")
-
-    def _employment_info(self, driver, occupation):
-        self.logger.debug(f"Confirming employment information as '{occupation}'")
-        self.wait_for_element(driver, 15, By.ID, "ProposerDetails.EmploymentStatusTypeId1")
-        driver.find_element(By.XPATH, "//*[@id='ProposerDetails.EmploymentStatusTypeId1']/..").click()
-        self.wait_for_element(driver, 15, By.ID, "ProposerDetails.OccupationTypeDescription")
-        driver.find_element(By.ID, "ProposerDetails.OccupationTypeDescription").send_keys(occupation)
-        driver.find_element(By.XPATH, "//*[@id='react-autowhatever-1--item-0']").click()
-        self.logger.debug(f"Done confirming employment information as '{occupation}'")
-
-    def _address_info(self, driver, eir_code):
-        self.logger.debug("Confirming address")
-        self.wait_for_element(driver, 15, By.ID, "ProposerDetails.AddressDisplayFormatted")
-        driver.find_element(By.ID, "ProposerDetails.AddressDisplayFormatted").send_keys(eir_code)
-        self.wait_for_element(driver, 15, By.ID, "react-autowhatever-1--item-0")
-        driver.find_element(By.XPATH, "//*[@id='react-autowhatever-1--item-0']").click()
-        driver.find_element(By.XPATH, "//*[@id='ProposerDetails.HouseHoldTypeId1']/..").click()
-        self.logger.debug("Done confirming address")
-
-    def _license_info(self, driver, license_held):
-        # License type
-        self.logger.debug(f"Inputting license information with license held for '{license_held}'")
-        self.wait_for_element(driver, 15, By.ID, "DrivingHistory.DrivingLicenceTypeId2")
-        driver.find_element(By.XPATH, "//*[@id='DrivingHistory.DrivingLicenceTypeId2']/..").click()
-        self.wait_for_element(driver, 15, By.ID, "DrivingHistory.AdvancedDriverTrainingTypeId2")
-        driver.find_element(By.XPATH, "//*[@id='DrivingHistory.AdvancedDriverTrainingTypeId2']/..").click()
-        # Licene held
-        Select(driver.find_element(By.ID, "DrivingHistory.YearsLicenceHeldTypeId")).select_by_visible_text(license_held)
-        # Penalty points
-        driver.find_element(By.XPATH, "//*[@id='DrivingHistory.PenaltyPointsDetails.HasPenaltyPoints2']/..").click()
-        self.logger.debug(f"Done inputting license information with license held for '{license_held}'")
-
-    def _insurance_info(self, driver):
-        self.logger.debug("Inputting previous insurance information")
-        # Recent insurance
-        self.wait_for_element(driver, 15, By.ID, "DrivingHistory.DrivingExperienceTypeId2")
-        driver.find_element(By.XPATH, "//*[@id='DrivingHistory.DrivingExperienceTypeId2']/..").click()
-        # More people in the house discount
-        driver.find_element(By.XPATH, "//*[@id='CoverDetails.HasMultiProductDiscount2']/..").click()
-        # # How to pay the price?
-        # driver.find_element(By.XPATH, "//*[@id='CoverDetails.NormalPaymentMethodTypeId1']/..").click()
-        self.logger.debug("Done inputting previous insurance information")
+    def _fill_field(self, driver, by, locator, action, value, wait_time_seconds=15):
+        by_type = By.ID if by == "id" else By.XPATH
+        element = WebDriverWait(driver, wait_time_seconds).until(EC.presence_of_element_located((by_type, locator)))
+        if action == "click":
+            element.click()
+        elif action == "input":
+            element.send_keys(value)
+        elif action == "select":
+            Select(element).select_by_visible_text(value)
+        elif action == "autocomplete":
+            element.send_keys(value)
+            self.wait_for_element(driver, wait_time_seconds, By.ID, AUTOCOMPLETE_SUGGESTION_ID)
+            driver.find_element(By.ID, AUTOCOMPLETE_SUGGESTION_ID).click()
+        else:
+            raise ValueError(f"Unknown form field action '{action}'")
+
+    def _fill_page_sequentially(self, driver, page, values, wait_time_seconds=15):
+        # every field is waited for and filled in with its own WebDriver calls
+        self.logger.debug(f"Filling in page '{page}' field by field")
+        for by, locator, action, key in FORM_PAGES[page]:
+            self._fill_field(driver, by, locator, action, values[key] if key else None, wait_time_seconds)
+        self.logger.debug(f"Done filling in page '{page}'")
 
     def _submit_and_get_quote(self, driver, registration, car_name):
         # Terms and conditions
@@ -245,7 +1697,7 @@ class QuoteHandler:
         self.wait_for_element(driver, 15, By.ID, "CarQuotePremium.QuoteReferenceIdForDisplay")
         ref_id = driver.find_element(By.XPATH, '//*[@id="CarQuotePremium.QuoteReferenceIdForDisplay"]').text
         quote = driver.find_element(By.XPATH, '//*[@id="YourQuote.Quote"]/div/div[1]/span/div/div[1]/div[2]').text
-        quote = Quote(registration, car_name, ref_id, float(quote[1:]))
+        quote = Quote(registration, car_name, ref_id, parse_price(quote))
         self.logger.debug(f"Done submitting request and getting quote for '{registration}', retrieved quote: '{quote}'")
         return quote
 
@@ -262,58 +1714,587 @@ class QuoteHandler:
 
         self.logger.debug("Done saving quote reference ID")
 
+    def _get_form_values(self, config):
+        year, month, day = config.date_of_birth.split('-')
+        return {
+            "annual_distance": config.annual_distance,
+            "first_name": config.first_name,
+            "last_name": config.last_name,
+            "date_of_birth_day": day,
+            "date_of_birth_month": month,
+            "date_of_birth_year": year,
+            "email": config.email,
+            "phone_number": config.phone_number,
+            "occupation": config.occupation,
+            "eir_code": config.eir_code,
+            "license_held": config.license_held,
+        }
+
+    def _fill_page(self, driver, page, values, wait_time_seconds=15):
+        self.logger.debug(f"Filling in page '{page}'")
+        fields = [{"by": by, "locator": locator, "action": action, "value": values[key] if key else None}
+            for by, locator, action, key in FORM_PAGES[page]]
+        # every field may wait up to wait_time_seconds inside the page
+        driver.set_script_timeout(wait_time_seconds*len(fields) + 5)
+        result = driver.execute_async_script(FILL_PAGE_SCRIPT, fields, wait_time_seconds*1000, AUTOCOMPLETE_SUGGESTION_ID)
+        if result["failed"]:
+            raise FormFillError(page, result["failed"])
+        self.logger.debug(f"Done filling in page '{page}'")
+
+    def _handle_cookie_banner(self, driver):
+        if not self.session_snapshot.is_valid():
+            self._accept_cookies(driver)
+            return
+        # the consent cookie was injected, so there is no need to wait for the banner
+        banners = driver.find_elements(By.ID, "_evidon-accept-button")
+        if banners:
+            self.logger.info("Cookie banner shown even though the session snapshot was injected")
+            self.session_snapshot.invalidate()
+            banners[0].click()
+
+    def _open_quote_form(self, driver, config):
+        # The pool already navigated to the quote form, fall back to walking
+        # there from the homepage if the deep link did not get us there
+        try:
+            with self.tracer.step("open_quote_form"):
+                self._handle_cookie_banner(driver)
+                self.wait_for_element(driver, 15, By.ID, "VehicleDetails.HasRegNumber1")
+            return
+        except TimeoutException:
+            self.logger.warning(f"Deep link '{config.get_quote_form_url()}' did not open the quote form, falling back to the homepage")
+            self.session_snapshot.invalidate()
+            driver.get(config.base_url)
+        self._walk_to_quote_form(driver)
+
+    def _walk_to_quote_form(self, driver):
+        with self.tracer.step("accept_cookies"):
+            self._handle_cookie_banner(driver)
+        with self.tracer.step("go_to_car_insurance_page"):
+            self._go_to_car_insurance_page(driver)
+
+    def get_quote_with_browser(self, driver, config, registration):
+        if config.entry_mode == "deep_link":
+            self._open_quote_form(driver, config)
+        else:
+            self._walk_to_quote_form(driver)
+        with self.tracer.step("confirm_car"):
+            car_name = self._confirm_car(driver, registration)
+        values = self._get_form_values(config)
+        fill_page = self._fill_page if config.fill_mode == "batched" else self._fill_page_sequentially
+        for page in FORM_PAGES:
+            with self.tracer.step(f"fill_{page}"):
+                fill_page(driver, page, values)
+        with self.tracer.step("submit_and_get_quote"):
+            quote = self._submit_and_get_quote(driver, registration, car_name)
+        with self.tracer.step("save_quote_reference_id"):
+            self._save_quote_reference_id(driver)
+        if not self.session_snapshot.is_valid():
+            self.session_snapshot.save(driver)
+        return quote
+
     def get_quote(self, config, registration, retry=3, sleep_time=60):
+        quote = self._get_quote(config, registration, retry, sleep_time)
+        if quote is not None:
+            self._set_price_metric(config.profile_name, registration, quote)
+        return quote
+
+    def _get_quote(self, config, registration, retry, sleep_time):
+        # Gets a quote without setting its quote_prices series
         self.logger.info(f"Getting quote for registration '{registration}'")
-        driver = self.get_driver()
+        if not self._is_valid_registration(registration):
+            return None
+        quote = self._get_fresh_stored_quote(config, registration)
+        if quote is not None:
+            return quote
+        start = perf_counter()
+        quote = None
+        try:
+            with self.tracer.span("quote", registration=registration):
+                quote = self._get_quote_with_retries(config, registration, retry, sleep_time)
+        finally:
+            outcome = "success" if quote is not None else "failure"
+            self._quote_latency.labels(outcome=outcome).observe(perf_counter() - start)
+        return quote
+
+    def _get_backoff_time(self, attempt, sleep_time):
+        # exponential backoff with jitter so workers do not retry in lockstep
+        backoff_time = min(self._retry_max_sleep_seconds, sleep_time * 2**attempt)
+        return backoff_time/2 + random.uniform(0, backoff_time/2)
+
+    def _get_quote_with_retries(self, config, registration, retry, sleep_time):
         for attempt in range(retry):
+            waited = self.circuit_breaker.wait_until_closed()
+            if waited >= 1:
+                self._retry_sleep.labels(reason="circuit_breaker").inc(waited)
+            if self._stopped.is_set():
+                self.logger.info(f"Not getting quote for registration '{registration}', shutting down")
+                return None
             try:
                 self.logger.debug(f"Attempt ({attempt+1}/{retry}): Getting quote for registration '{registration}'")
-                driver.get("https://www.axa.ie/")
-                self._accept_cookies(driver)
-                self._go_to_car_insurance_page(driver)
-                car_name = self._confirm_car(driver, registration)
-                self._business_use_info(driver)
-                self._annual_distance(driver, config.annual_distance)
-                self._user_info(driver, config.first_name, config.last_name, config.date_of_birth, config.email, config.phone_number)
-                self._employment_info(driver, config.occupation)
-                self._address_info(driver, config.eir_code)
-                self._license_info(driver, config.license_held)
-                self._insurance_info(driver)
-                quote = self._submit_and_get_quote(driver, registration, car_name)
-                self._save_quote_reference_id(driver)
-                self.registration_metrics.labels(registration=registration, car_name=car_name).set(quote.price)
-                self.logger.debug(f"Done getting quote for registration '{registration}': '{car_name}' with quote '{quote}'")
+                with self.tracer.span("attempt", registration=registration, attempt=attempt+1):
+                    quote = self.engine.get_quote(config, registration)
+                self.circuit_breaker.record_success()
+                if self.quote_store is not None:
+                    self.quote_store.add(quote, config.get_profile_hash())
+                self._record_first_quote()
+                self.logger.debug(f"Done getting quote for registration '{registration}': '{quote.car_name}' with quote '{quote}'")
                 self.logger.info(f"{quote}")
                 return quote
             except Exception as e:
+                if self._stopped.is_set():
+                    # most likely the browser was torn down under it
+                    self.logger.info(f"Attempt ({attempt+1}/{retry}): Stopped getting quote for registration '{registration}', shutting down")
+                    return None
+                error_class = classify_error(e)
                 self.failed_attempts.inc()
+                self._attempt_failures.labels(step=getattr(e, "quote_step", None) or "unknown").inc()
+                if error_class == "vehicle_not_found":
+                    # the site answered, only this registration is wrong
+                    self.circuit_breaker.record_success()
+                    self.vehicle_cache.put_invalid(registration)
+                else:
+                    self.circuit_breaker.record_failure()
+                if error_class in PERMANENT_ERROR_CLASSES:
+                    self.logger.error(f"Attempt ({attempt+1}/{retry}): Failed to get quote for registration '{registration}' with '{error_class}' error, not retrying: {e}")
+                    return None
                 self.logger.exception(e)
-                self.logger.error(f"Attempt ({attempt+1}/{retry}): Failed to get quote for registration '{registration}'. Retrying after sleeping for {self._get_formatted_time(sleep_time)}")
-                sleep(sleep_time)
-
-    def get_quotes(self, config, registrations, retry=3, sleep_time=60):
-        self.logger.debug(f"Getting quotes for registrations '{registrations}'")
-        quotes = set()
-        for registration in registrations:
-            quotes.add(self.get_quote(config, registration, retry=retry, sleep_time=sleep_time))
-        self.logger.debug(f"Done getting quotes for registrations '{registrations}'")
-        return quotes
-    
-    def print_summary(self, quotes):
-        self.logger.info("====== Summary ======")
-        [self.logger.info(quote) for quote in quotes]
-        self.logger.info("======== End ========")
-        
-    def monitor_forever(self, config, retry=3, sleep_time=60, monitor_break_seconds=8*60*60):
-        self.logger.info(f"Starting monitoring with interval of {self._get_formatted_time(monitor_break_seconds)}")
-        while True:
-            self.logger.info(f"Monitoring triggered at {datetime.now()}")
-            self.get_quotes(config, config.registrations, retry=retry, sleep_time=sleep_time)
-            sleep(monitor_break_seconds)
+                if attempt+1 == retry:
+                    self.logger.error(f"Attempt ({attempt+1}/{retry}): Failed to get quote for registration '{registration}' with '{error_class}' error, giving up")
+                    return None
+                self._retries.labels(error_class=error_class).inc()
+                backoff_time = self._get_backoff_time(attempt, sleep_time)
+                self.logger.error(f"Attempt ({attempt+1}/{retry}): Failed to get quote for registration '{registration}' with '{error_class}' error. Retrying after sleeping for {self._get_formatted_time(int(backoff_time))}")
+                self._retry_sleep.labels(reason="backoff").inc(backoff_time)
+                if self._stopped.wait(backoff_time):
+                    self.logger.info(f"Not retrying quote for registration '{registration}', shutting down")
+                    return None
+
+    def _record_first_quote(self):
+        with self._first_quote_lock:
+            if self._got_first_quote:
+                return
+            self._got_first_quote = True
+        time_to_first_quote = time() - self._started_at
+        self._time_to_first_quote.set(time_to_first_quote)
+        self.logger.info(f"Got the first quote {self._get_formatted_time(int(time_to_first_quote))} after starting")
+
+    def _is_valid_registration(self, registration):
+        if not REGISTRATION_PATTERN.match(normalize_registration(registration)):
+            self.logger.error(f"Skipping registration '{registration}', it is not a valid registration")
+            return False
+        if self.vehicle_cache.is_invalid(registration):
+            self.logger.error(f"Skipping registration '{registration}', no vehicle was found for it before")
+            return False
+        return True
+
+    def _get_fresh_stored_quote(self, config, registration):
+        if self.quote_store is None or config.quote_ttl_seconds <= 0:
+            return None
+        latest = self.quote_store.get_latest(registration, config.get_profile_hash())
+        if latest is None:
+            return None
+        timestamp, quote = latest
+        age = time() - timestamp
+        if age >= config.quote_ttl_seconds:
+            return None
+        self.logger.info(f"Skipping registration '{registration}', last quote is {self._get_formatted_time(int(age))} old: {quote}")
+        return quote
+
+    def plan_jobs(self, config):
+        jobs = plan_quote_jobs(config)
+        shard_jobs = get_shard_jobs(jobs, config.shard_index, config.shard_count)
+        self._shard_jobs.labels(shard=str(config.shard_index)).set(len(shard_jobs))
+        self.logger.info(f"Planned {len(jobs)} quote job(s) for {len(config.profiles)} profile(s), "
+            f"{len(shard_jobs)} of them on shard {config.shard_index} of {config.shard_count}")
+        return shard_jobs
+
+    def warm_metrics(self, config, jobs):
+        # Set the gauges from the stored quotes so they are not empty until
+        # every registration has been quoted again after a restart
+        if self.quote_store is None:
+            return
+        count = 0
+        profiles = {job.profile.name: job.profile for job in jobs}
+        for profile in profiles.values():
+            # stored normalized, the series are labelled with the registration as configured
+            registrations = {normalize_registration(job.registration): job.registration for job in jobs if job.profile is profile}
+            for timestamp, quote in self.quote_store.get_latest_quotes(profile.get_hash()):
+                if quote.registration in registrations:
+                    self._set_price_metric(profile.name, registrations[quote.registration], quote)
+                    count += 1
+        self.logger.info(f"Warmed up metrics with {count} stored quote(s)")
+
+    def monitor_forever(self, config, jobs):
+        self.logger.info(f"Starting monitoring of {len(jobs)} job(s) with interval of {self._get_formatted_time(config.monitor_interval_seconds)}")
+        with self._reload_lock:
+            self._monitor_config = config
+            self._jobs = list(jobs)
+            self.scheduler.schedule_evenly(jobs)
+        self.scheduler.run_forever()
+
+    def stop(self):
+        # Called on SIGTERM. The monitor loop returns without waiting for the
+        # quotes in flight, which give up at their next attempt, backoff or
+        # circuit breaker wait so the browsers can be torn down straight away.
+        if self._stopped.is_set():
+            return
+        self.logger.info("Stopping, quotes in flight are abandoned")
+        self._stopped.set()
+        self.circuit_breaker.stop()
+        self.scheduler.stop()
+
+    def _run_job(self, job):
+        # the config can be swapped by a reload while the monitor runs
+        config = self._monitor_config
+        quote = self._get_quote(config.for_profile(job.profile), job.registration, config.retries, config.retry_sleep_seconds)
+        with self._reload_lock:
+            # A job removed by a reload while it was running had its series
+            # removed then, and the job replacing an edited profile has the
+            # same labels, so only the job still scheduled sets the price
+            if quote is not None and self.scheduler.has_job(job):
+                self._set_price_metric(job.profile.name, job.registration, quote)
+        return quote
+
+    def reload_config(self, config):
+        # Applies a new config to the running monitor. Jobs that are still
+        # there keep their schedule, removed jobs are unscheduled with their
+        # series and new jobs are scheduled right away. A changed profile has
+        # a new hash, so only its jobs are replaced and its stored quotes are
+        # no longer used.
+        with self._reload_lock:
+            for key in RESTART_REQUIRED_KEYS:
+                if getattr(self._monitor_config, key) != getattr(config, key):
+                    self.logger.warning(f"Config '{key}' changed, it is only applied after a restart")
+            old_jobs = OrderedDict(((job.profile.name, job.key), job) for job in self._jobs)
+            new_jobs = OrderedDict(((job.profile.name, job.key), job) for job in self.plan_jobs(config))
+            removed_jobs = [job for job_id, job in old_jobs.items() if job_id not in new_jobs]
+            added_jobs = [job for job_id, job in new_jobs.items() if job_id not in old_jobs]
+            for job in removed_jobs:
+                self.scheduler.remove(job)
+                self._remove_price_metrics(job.profile.name, job.registration)
+            self._monitor_config = config
+            self._jobs = [old_jobs.get(job_id, job) for job_id, job in new_jobs.items()]
+            self.scheduler.set_intervals(config.monitor_interval_seconds, config.min_monitor_interval_seconds, config.max_monitor_interval_seconds)
+            self.warm_metrics(config, added_jobs)
+            now = time()
+            for job in added_jobs:
+                self.scheduler.schedule(job, now)
+        self.logger.info(f"Reloaded config, {len(added_jobs)} job(s) added and {len(removed_jobs)} removed")
+
+    def _set_price_metric(self, profile_name, registration, quote):
+        with self._price_labels_lock:
+            self._price_labels.setdefault((profile_name, registration), set()).add(quote.car_name)
+        self.registration_metrics.labels(profile=profile_name, registration=registration, car_name=quote.car_name).set(quote.price)
+
+    def _remove_price_metrics(self, profile_name, registration):
+        with self._price_labels_lock:
+            car_names = self._price_labels.pop((profile_name, registration), set())
+        for car_name in car_names:
+            try:
+                self.registration_metrics.remove(profile_name, registration, car_name)
+            except KeyError:
+                pass
 
     def _get_formatted_time(self, time_in_seconds):
         return f"{timedelta(seconds=time_in_seconds)} (hh:mm:ss)"
 
+class ResourceProfiler:
+    # Samples the RSS, CPU time and open file descriptors of this process and
+    # of every chromedriver and Chrome process under it, which the default
+    # process metrics do not cover. Also serves tracemalloc snapshots and a
+    # sampled profile of the threads of this process on demand.
+    PROCESS_KINDS = ("python", "chromedriver", "chrome", "other")
+    MAX_CPU_PROFILE_SECONDS = 60
+
+    def __init__(self, logger, interval_seconds=15):
+        self._logger = logger
+        self._interval_seconds = interval_seconds
+        self._lock = threading.Lock()
+        self._processes = []
+        self._cpu_seconds = {}
+        self._snapshot = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="resource-profiler", daemon=True)
+        self._rss_metric = Gauge("process_tree_rss_bytes", "RSS of this process and the processes it started, by kind of process", ['process'])
+        self._open_fds_metric = Gauge("process_tree_open_fds", "Open file descriptors of this process and the processes it started, by kind of process", ['process'])
+        self._processes_metric = Gauge("process_tree_processes", "Number of running processes started by this process, by kind of process", ['process'])
+        self._cpu_metric = Counter("process_tree_cpu_seconds", "CPU time of this process and the processes it started, by kind of process", ['process'])
+
+    @property
+    def logger(self):
+        return self._logger
+
+    def start(self):
+        self.sample()
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def add_routes(self, status_server):
+        status_server.add_route("/debug/resources", self._get_resources)
+        status_server.add_route("/debug/tracemalloc", self._get_tracemalloc)
+        status_server.add_route("/debug/cpu-profile", self._get_cpu_profile)
+
+    def sample(self):
+        processes = [process for process in (self._read_process(pid) for pid in _get_process_tree(os.getpid())) if process is not None]
+        cpu_seconds = {}
+        for kind in self.PROCESS_KINDS:
+            kind_processes = [process for process in processes if process["process"] == kind]
+            self._rss_metric.labels(process=kind).set(sum(process["rss_bytes"] for process in kind_processes))
+            self._open_fds_metric.labels(process=kind).set(sum(process["open_fds"] for process in kind_processes))
+            self._processes_metric.labels(process=kind).set(len(kind_processes))
+        for process in processes:
+            # CPU time of processes that exited since the last sample is lost
+            cpu_seconds[process["pid"]] = process["cpu_seconds"]
+            self._cpu_metric.labels(process=process["process"]).inc(
+                max(0, process["cpu_seconds"] - self._cpu_seconds.get(process["pid"], 0)))
+        with self._lock:
+            self._processes = processes
+            self._cpu_seconds = cpu_seconds
+
+    def _read_process(self, pid):
+        try:
+            with open(f"/proc/{pid}/comm") as comm:
+                name = comm.read().strip()
+            with open(f"/proc/{pid}/stat") as stat:
+                fields = stat.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{pid}/statm") as statm:
+                rss_pages = int(statm.read().split()[1])
+            open_fds = len(os.listdir(f"/proc/{pid}/fd"))
+        except (OSError, IndexError, ValueError):
+            return None
+        if pid == os.getpid():
+            kind = "python"
+        elif name == "chromedriver":
+            kind = "chromedriver"
+        elif "chrome" in name or name == "headless_shell":
+            kind = "chrome"
+        else:
+            kind = "other"
+        return {
+            "pid": pid,
+            "name": name,
+            "process": kind,
+            "rss_bytes": rss_pages * os.sysconf("SC_PAGE_SIZE"),
+            # user and system time
+            "cpu_seconds": (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK"),
+            "open_fds": open_fds,
+        }
+
+    def _run(self):
+        while not self._stopped.wait(self._interval_seconds):
+            try:
+                self.sample()
+            except Exception as e:
+                self.logger.warning(f"Failed to sample resource usage: {e}")
+
+    def _get_resources(self, query):
+        # the latest sample of every process
+        if not self._thread.is_alive():
+            self.sample()
+        with self._lock:
+            processes = list(self._processes)
+        return (200, "application/json", json.dumps({"processes": processes}, indent=2) + "\n")
+
+    def _get_tracemalloc(self, query):
+        # ?action=start&frames=N starts tracing, ?action=stop stops it and
+        # otherwise the top allocation sites are returned, grouped by
+        # key_type, or compared with the previous snapshot with compare=true
+        action = query.get("action", ["top"])[0]
+        if action == "start":
+            tracemalloc.start(int(query.get("frames", ["1"])[0]))
+            return (200, "text/plain", "Started tracing memory allocations\n")
+        if action == "stop":
+            tracemalloc.stop()
+            self._snapshot = None
+            return (200, "text/plain", "Stopped tracing memory allocations\n")
+        if not tracemalloc.is_tracing():
+            return (409, "text/plain", "Memory allocations are not being traced, start with ?action=start\n")
+        key_type = query.get("key_type", ["lineno"])[0]
+        if key_type not in ("lineno", "filename", "traceback"):
+            raise ValueError(f"key_type must be one of 'lineno', 'filename' or 'traceback', got '{key_type}'")
+        limit = int(query.get("limit", ["25"])[0])
+        snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+        if query.get("compare", ["false"])[0].lower() == "true" and self._snapshot is not None:
+            stats = snapshot.compare_to(self._snapshot, key_type)
+        else:
+            stats = snapshot.statistics(key_type)
+        self._snapshot = snapshot
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"Traced memory: {current} bytes, peak: {peak} bytes", ""]
+        for stat in stats[:limit]:
+            lines.append(str(stat))
+            if key_type == "traceback":
+                lines.extend(stat.traceback.format())
+        return (200, "text/plain", "\n".join(lines) + "\n")
+
+    def _get_cpu_profile(self, query):
+        # Samples the stack of every other thread for the given number of
+        # seconds. Threads waiting on I/O or a lock are sampled too, so this
+        # shows where the time goes rather than only the CPU used. The stacks
+        # are returned collapsed, one per line with its number of samples,
+        # ready for flamegraph.pl or speedscope.
+        seconds = float(query.get("seconds", ["10"])[0])
+        if not seconds > 0:
+            raise ValueError(f"seconds must be above 0, got '{seconds}'")
+        seconds = min(self.MAX_CPU_PROFILE_SECONDS, seconds)
+        interval_seconds = float(query.get("interval_ms", ["10"])[0]) / 1000
+        # an interval of 0 would busy-spin on the GIL for the whole profile
+        if not 0 < interval_seconds <= seconds:
+            raise ValueError(f"interval_ms must be above 0 and at most the profile duration, got '{interval_seconds*1000}'")
+        profiler_thread_id = threading.get_ident()
+        stacks = {}
+        end = perf_counter() + seconds
+        while perf_counter() < end:
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == profiler_thread_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                collapsed_stack = ";".join(reversed(stack))
+                stacks[collapsed_stack] = stacks.get(collapsed_stack, 0) + 1
+            sleep(interval_seconds)
+        return (200, "text/plain", "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items(), key=lambda item: -item[1])))
+
+class StatusServer:
+    # Serves the Prometheus metrics like start_http_server does, plus extra
+    # routes like the readiness endpoint probed by kubernetes. A route is a
+    # function taking the parsed query string and returning
+    # (status, content type, body).
+    def __init__(self, logger, port, address=""):
+        self._logger = logger
+        self._routes = {}
+        self._ready = threading.Event()
+        self._started_at = _get_process_start_time() or time()
+        self._startup_duration = Gauge("startup_duration_seconds", "Time from the process starting to being ready")
+        self.add_route("/ready", self._get_readiness)
+        self._server = ThreadingHTTPServer((address, port), get_status_request_handler(self._routes))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="status-server", daemon=True)
+
+    @property
+    def logger(self):
+        return self._logger
+
+    @property
+    def is_ready(self):
+        return self._ready.is_set()
+
+    @property
+    def port(self):
+        return self._server.server_port
+
+    def add_route(self, path, route):
+        self._routes[path] = route
+
+    def start(self):
+        self._thread.start()
+        self.logger.info(f"Serving metrics on port {self.port}")
+
+    def set_ready(self):
+        startup_duration = time() - self._started_at
+        self._startup_duration.set(startup_duration)
+        self._ready.set()
+        self.logger.info(f"Ready {startup_duration:.1f} second(s) after starting")
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _get_readiness(self, query):
+        if self.is_ready:
+            return (200, "text/plain", "ready\n")
+        return (503, "text/plain", "not ready\n")
+
+class ConfigWatcher:
+    # Polls the config file and applies it when its content changes. A
+    # ConfigMap mounted in kubernetes is updated by swapping a symlink, so
+    # the content is compared rather than the modification time. A config
+    # that does not load or validate is skipped until the file changes again.
+    def __init__(self, logger, path, load_config, apply_config, interval_seconds=30):
+        self._logger = logger
+        self._path = path
+        self._load_config = load_config
+        self._apply_config = apply_config
+        self._interval_seconds = interval_seconds
+        self._digest = self._get_digest()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+        self._reloads = Counter("config_reloads", "Config changes applied without a restart")
+        self._reload_latency = Histogram("config_reload_duration_seconds", "Time taken to load, validate and apply a changed config",
+            buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf")))
+        self._validation_failures = Counter("config_validation_failures", "Config changes not applied because they were not valid")
+
+    @property
+    def logger(self):
+        return self._logger
+
+    def start(self):
+        self.logger.info(f"Watching config file '{self._path}' for changes every {self._interval_seconds} second(s)")
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def check(self):
+        digest = self._get_digest()
+        if digest is None or digest == self._digest:
+            return False
+        self._digest = digest
+        self.logger.info(f"Config file '{self._path}' changed, reloading")
+        start = perf_counter()
+        try:
+            config = self._load_config()
+        except Exception as e:
+            self._validation_failures.inc()
+            self.logger.error(f"Not reloading the config, it is not valid: {e}")
+            return False
+        self._apply_config(config)
+        self._reloads.inc()
+        self._reload_latency.observe(perf_counter() - start)
+        return True
+
+    def _get_digest(self):
+        try:
+            with open(self._path, "rb") as stream:
+                return hashlib.sha256(stream.read()).hexdigest()
+        except OSError as e:
+            self.logger.debug(f"Could not read config file '{self._path}': {e}")
+            return None
+
+    def _run(self):
+        while not self._stopped.wait(self._interval_seconds):
+            try:
+                self.check()
+            except Exception as e:
+                self.logger.exception(e)
+
+def get_status_request_handler(routes):
+    class StatusRequestHandler(MetricsHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            route = routes.get(url.path)
+            if route is None:
+                return super().do_GET()
+            try:
+                status, content_type, body = route(parse_qs(url.query))
+            except ValueError as e:
+                status, content_type, body = (400, "text/plain", f"{e}\n")
+            if isinstance(body, str):
+                body = body.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return StatusRequestHandler
+
 def get_args():
     parser = argparse.ArgumentParser("axa", description="Get car insurance quotes from Axa based on certain assumption. Read the README on https://github.com/Kimi450/axa for more information. Provide the arguments from either 'no_config_file_args_group' or 'config_file_args_group'.")
 
@@ -330,6 +2311,15 @@ def get_args():
     no_config_file_args_group.add_argument("--registrations", dest="registrations", help="List of vehicle registrations", type=str, action="extend", nargs="+")
     no_config_file_args_group.add_argument("--prometheus-client-port", dest="prometheus_client_port", help="Port at which the Prometheus client server runs", type=int)
 
+    optional_args_group = parser.add_argument_group("optional_args_group", "Group of optional arguments, these override the values in the config file if provided")
+    optional_args_group.add_argument("--workers", dest="workers", help="Number of registrations to get quotes for concurrently, each worker runs its own browser (default: 1)", type=int)
+    optional_args_group.add_argument("--engine", dest="engine", help="Engine used to get quotes, 'selenium' drives the website in Chrome and 'http' (experimental, only known to match the local mock) posts the form answers as JSON (default: selenium)", type=str, choices=["selenium", "http"])
+    optional_args_group.add_argument("--history-file", dest="history_file", help="SQLite file every quote is stored in, no history is kept if not set", type=str)
+    optional_args_group.add_argument("--quote-ttl-seconds", dest="quote_ttl_seconds", help="Skip registrations with a stored quote for the same profile younger than this (default: 0, never skip)", type=int)
+    optional_args_group.add_argument("--export-history", dest="export_history", help="Export the quote history from the history file to this file ('-' for stdout) and exit", type=str)
+    optional_args_group.add_argument("--export-format", dest="export_format", help="Format of the exported quote history (default: jsonl)", type=str, choices=["jsonl", "csv"], default="jsonl")
+    optional_args_group.add_argument("--fill-mode", dest="fill_mode", help="How the website form is filled in by the selenium engine, 'sequential' uses one WebDriver call per field and 'batched' fills in a whole page in one call (default: sequential)", type=str, choices=["sequential", "batched"])
+
     config_file_args_group = parser.add_argument_group("config_file_args_group", "Group of required arguments if config file is provided")
     config_file_args_group.add_argument("--config-file", dest="config_file", help="Config file instead of inputting all the required parameters", type=str)
 
@@ -362,24 +2352,72 @@ def parse_config_file(file, perms):
     with open(file, perms) as stream:
         try:
             parsed_yaml=yaml.safe_load(stream)
-            config = Config(parsed_yaml["annual_distance"],
-                parsed_yaml["first_name"],
-                parsed_yaml["last_name"],
-                parsed_yaml["date_of_birth"],
-                parsed_yaml["phone_number"],
-                parsed_yaml["email"],
-                parsed_yaml["occupation"],
-                parsed_yaml["eir_code"],
-                parsed_yaml["license_held"],
-                parsed_yaml["registrations"]
+            # the answers can be given once at the top level or per profile
+            profiles = None
+            if "profiles" in parsed_yaml:
+                profiles = [Profile(parsed_profile.get("name", f"profile-{index+1}"), *[parsed_profile[field] for field in Profile.FIELDS])
+                    for index, parsed_profile in enumerate(parsed_yaml["profiles"])]
+            default_profile = profiles[0] if profiles else Profile("default", *[parsed_yaml[field] for field in Profile.FIELDS])
+            config = Config(default_profile.annual_distance,
+                default_profile.first_name,
+                default_profile.last_name,
+                default_profile.date_of_birth,
+                default_profile.phone_number,
+                default_profile.email,
+                default_profile.occupation,
+                default_profile.eir_code,
+                default_profile.license_held,
+                parsed_yaml.get("registrations", []),
+                workers=int(parsed_yaml.get("workers", 1)),
+                driver_max_uses=int(parsed_yaml.get("driver_max_uses", 20)),
+                driver_max_rss_mb=int(parsed_yaml.get("driver_max_rss_mb", 0)),
+                engine=parsed_yaml.get("engine", "selenium"),
+                fill_mode=parsed_yaml.get("fill_mode", "sequential"),
+                trace_file=parsed_yaml.get("trace_file", ""),
+                lean_browser=str(parsed_yaml.get("lean_browser", False)).lower() == "true",
+                page_load_strategy=parsed_yaml.get("page_load_strategy", "normal"),
+                browser_network_stats=str(parsed_yaml.get("browser_network_stats", False)).lower() == "true",
+                blocked_resource_types=parsed_yaml.get("blocked_resource_types", ["image", "media", "font"]),
+                blocked_domains=parsed_yaml.get("blocked_domains", []),
+                history_file=parsed_yaml.get("history_file", ""),
+                quote_ttl_seconds=int(parsed_yaml.get("quote_ttl_seconds", 0)),
+                vehicle_cache_ttl_seconds=int(parsed_yaml.get("vehicle_cache_ttl_seconds", 30*24*60*60)),
+                vehicle_not_found_ttl_seconds=int(parsed_yaml.get("vehicle_not_found_ttl_seconds", 24*60*60)),
+                vehicle_cache_size=int(parsed_yaml.get("vehicle_cache_size", 1000)),
+                entry_mode=parsed_yaml.get("entry_mode", "homepage"),
+                quote_form_url=parsed_yaml.get("quote_form_url", "/car-insurance/get-a-quote/"),
+                session_snapshot_file=parsed_yaml.get("session_snapshot_file", ""),
+                retries=int(parsed_yaml.get("retries", 3)),
+                retry_sleep_seconds=int(parsed_yaml.get("retry_sleep_seconds", 60)),
+                retry_max_sleep_seconds=int(parsed_yaml.get("retry_max_sleep_seconds", 600)),
+                circuit_breaker_threshold=int(parsed_yaml.get("circuit_breaker_threshold", 5)),
+                circuit_breaker_cooldown_seconds=int(parsed_yaml.get("circuit_breaker_cooldown_seconds", 900)),
+                base_url=parsed_yaml.get("base_url", DEFAULT_BASE_URL),
+                chromedriver_path=parsed_yaml.get("chromedriver_path", "/usr/local/bin/chromedriver"),
+                chromedriver_auto_install=str(parsed_yaml.get("chromedriver_auto_install", False)).lower() == "true",
+                warm_up_browsers=str(parsed_yaml.get("warm_up_browsers", False)).lower() == "true",
+                profiles=profiles,
+                quote_pairs=[(pair["profile"], pair["registration"]) for pair in parsed_yaml.get("quote_pairs", [])],
+                # -1 until load_config resolves it from the pod name
+                shard_index=int(parsed_yaml.get("shard_index", -1)),
+                shard_count=int(parsed_yaml.get("shard_count", 1)),
+                monitor_interval_seconds=int(parsed_yaml.get("monitor_interval_seconds", 8*60*60)),
+                min_monitor_interval_seconds=int(parsed_yaml.get("min_monitor_interval_seconds", 2*60*60)),
+                max_monitor_interval_seconds=int(parsed_yaml.get("max_monitor_interval_seconds", 24*60*60)),
+                config_reload_interval_seconds=int(parsed_yaml.get("config_reload_interval_seconds", 30)),
+                resource_sample_interval_seconds=int(parsed_yaml.get("resource_sample_interval_seconds", 15)),
+                profiling_endpoints=str(parsed_yaml.get("profiling_endpoints", False)).lower() == "true"
             )
             prometheus_client_port = int(parsed_yaml["prometheus_client_port"])
-        except yaml.YAMLError as exc:
-            print(exc)
-            exit()
+        except KeyError as exc:
+            raise ValueError(f"Missing config key {exc}")
+        except TypeError as exc:
+            raise ValueError(f"Invalid config file: {exc}")
     return (config, prometheus_client_port)
 
-def parse_args(args):
+def load_config(args):
+    # The config from the config file or the arguments with the overrides
+    # applied, raises ValueError if it is not valid
     if args.config_file is not None: # config file
         config, prometheus_client_port = parse_config_file(args.config_file, 'r')
     else: # args
@@ -395,13 +2433,113 @@ def parse_args(args):
             args.registrations
         )
         prometheus_client_port = int(args.prometheus_client_port)
+    if args.workers is not None:
+        config.workers = args.workers
+    if args.engine is not None:
+        config.engine = args.engine
+    if config.engine not in ("selenium", "http"):
+        raise ValueError(f"Engine must be one of 'selenium' or 'http', got '{config.engine}'")
+    if args.history_file is not None:
+        config.history_file = args.history_file
+    if args.quote_ttl_seconds is not None:
+        config.quote_ttl_seconds = args.quote_ttl_seconds
+    if args.export_history is not None and not config.history_file:
+        raise ValueError("A history file is needed to export the quote history")
+    if config.entry_mode not in ("homepage", "deep_link"):
+        raise ValueError(f"Entry mode must be one of 'homepage' or 'deep_link', got '{config.entry_mode}'")
+    if config.page_load_strategy not in ("normal", "eager", "none"):
+        raise ValueError(f"Page load strategy must be one of 'normal', 'eager' or 'none', got '{config.page_load_strategy}'")
+    unknown_resource_types = set(config.blocked_resource_types) - set(BLOCKED_RESOURCE_TYPE_PATTERNS)
+    if unknown_resource_types:
+        raise ValueError(f"Blocked resource types must be some of {list(BLOCKED_RESOURCE_TYPE_PATTERNS)}, got {sorted(unknown_resource_types)}")
+    if args.fill_mode is not None:
+        config.fill_mode = args.fill_mode
+    if config.fill_mode not in ("sequential", "batched"):
+        raise ValueError(f"Fill mode must be one of 'sequential' or 'batched', got '{config.fill_mode}'")
+    if config.workers < 1:
+        raise ValueError(f"Number of workers must be at least 1, got {config.workers}")
+    profile_names = [profile.name for profile in config.profiles]
+    if len(set(profile_names)) != len(profile_names):
+        raise ValueError(f"Profile names must be unique, got {profile_names}")
+    unknown_profile_names = set(profile_name for profile_name, registration in config.quote_pairs) - set(profile_names)
+    if unknown_profile_names:
+        raise ValueError(f"Quote pairs must use the names of the profiles {profile_names}, got {sorted(unknown_profile_names)}")
+    if not config.registrations and not config.quote_pairs:
+        raise ValueError("At least one registration or quote pair is needed")
+    # The Helm chart sets SHARD_COUNT to the number of replicas and POD_NAME,
+    # the index of a StatefulSet pod is the ordinal at the end of its name
+    config.shard_count = int(os.environ.get("SHARD_COUNT", config.shard_count))
+    config.shard_index = int(os.environ.get("SHARD_INDEX", config.shard_index))
+    if config.shard_index < 0:
+        ordinal = re.search(r"-(\d+)$", os.environ.get("POD_NAME", ""))
+        config.shard_index = int(ordinal.group(1)) if ordinal else 0
+    if config.resource_sample_interval_seconds < 0:
+        raise ValueError(f"Resource sample interval must be at least 0, got {config.resource_sample_interval_seconds}")
+    if config.config_reload_interval_seconds < 0:
+        raise ValueError(f"Config reload interval must be at least 0, got {config.config_reload_interval_seconds}")
+    if not 0 < config.min_monitor_interval_seconds <= config.monitor_interval_seconds <= config.max_monitor_interval_seconds:
+        raise ValueError(f"Monitor intervals must be above 0 with min <= interval <= max, got {config.min_monitor_interval_seconds} <= {config.monitor_interval_seconds} <= {config.max_monitor_interval_seconds}")
+    if config.shard_count < 1 or not 0 <= config.shard_index < config.shard_count:
+        raise ValueError(f"Shard index must be between 0 and the shard count minus 1, got index {config.shard_index} of {config.shard_count} shard(s)")
     return (config, prometheus_client_port)
 
+def parse_args(args):
+    try:
+        return load_config(args)
+    except (yaml.YAMLError, ValueError) as e:
+        print(e)
+        exit()
+
+def export_history(config, file, export_format):
+    quote_store = QuoteStore(config.history_file, logging.getLogger(__name__))
+    try:
+        if file == "-":
+            count = quote_store.export(sys.stdout, export_format)
+        else:
+            with open(file, "w", newline="") as stream:
+                count = quote_store.export(stream, export_format)
+    finally:
+        quote_store.close()
+    print(f"Exported {count} quote(s) to '{file}'", file=sys.stderr)
 
 def main():
-    config, prometheus_client_port = parse_args(get_args())
-    start_http_server(prometheus_client_port)
-    quote_handler = QuoteHandler()
-    quote_handler.monitor_forever(config)
+    args = get_args()
+    config, prometheus_client_port = parse_args(args)
+    if args.export_history is not None:
+        export_history(config, args.export_history, args.export_format)
+        return
+    # up before anything slow so the startup can be watched
+    status_server = StatusServer(logging.getLogger(__name__), prometheus_client_port)
+    resource_profiler = ResourceProfiler(logging.getLogger(__name__), interval_seconds=config.resource_sample_interval_seconds)
+    if config.profiling_endpoints:
+        resource_profiler.add_routes(status_server)
+    status_server.start()
+    if config.resource_sample_interval_seconds > 0:
+        resource_profiler.start()
+    quote_handler = QuoteHandler(config)
+    jobs = quote_handler.plan_jobs(config)
+    quote_handler.warm_metrics(config, jobs)
+    # on SIGTERM from kubernetes stop quoting and tear the browsers down
+    # before the grace period runs out
+    signal.signal(signal.SIGTERM, lambda signum, frame: quote_handler.stop())
+    if args.config_file is not None and config.config_reload_interval_seconds > 0:
+        config_watcher = ConfigWatcher(quote_handler.logger, args.config_file,
+            lambda: load_config(args)[0], quote_handler.reload_config,
+            interval_seconds=config.config_reload_interval_seconds)
+        config_watcher.start()
+    try:
+        if config.warm_up_browsers and config.engine == "selenium":
+            quote_handler.driver_pool.warm_up()
+        status_server.set_ready()
+        quote_handler.monitor_forever(config, jobs)
+    finally:
+        # also when interrupted, so no quote is retried once the browsers are gone
+        quote_handler.stop()
+        quote_handler.driver_pool.shutdown()
+        quote_handler.tracer.close()
+        if quote_handler.quote_store is not None:
+            quote_handler.quote_store.close()
+        quote_handler.vehicle_cache.close()
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
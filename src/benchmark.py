@@ -0,0 +1,231 @@
+#!/usr/local/bin/python
+
+import argparse
+import json
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from time import perf_counter
+
+from prometheus_client import REGISTRY
+
+import axa
+import mock_axa
+
+# Benchmarks QuoteHandler against the local mock of the website, so tuning
+# changes can be measured without hitting the live site or saving real quotes.
+
+class MemorySampler:
+    # Samples the RSS of every pooled browser and keeps the peak of each
+    def __init__(self, driver_pool, interval_seconds=0.5):
+        self._driver_pool = driver_pool
+        self._interval_seconds = interval_seconds
+        self._peaks = {}
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+
+    @property
+    def peaks(self):
+        return dict(self._peaks)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self._interval_seconds):
+            for browser_id, rss in self._driver_pool.get_memory_usage().items():
+                self._peaks[browser_id] = max(rss, self._peaks.get(browser_id, 0))
+
+def get_percentile(values, percentile):
+    # nearest rank percentile
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(0, min(len(values) - 1, int(round(percentile/100 * len(values))) - 1))
+    return values[rank]
+
+def get_webdriver_command_counts():
+    counts = {}
+    for metric in REGISTRY.collect():
+        if metric.name == "webdriver_commands":
+            for sample in metric.samples:
+                if sample.name == "webdriver_commands_total":
+                    counts[sample.labels["command"]] = int(sample.value)
+    return counts
+
+def get_registrations(count):
+    return [f"{10 + index % 14}D{1000 + index}" for index in range(count)]
+
+def run_benchmark(args, logger):
+    mock = mock_axa.MockAxa(logger,
+        latency_ms=args.latency_ms,
+        failure_rate=args.failure_rate)
+    server = mock_axa.start_mock_server(mock)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    registrations = get_registrations(args.warm_up + args.quotes)
+    config = axa.Config("Up to 10,000 km", "John", "Doe", "1950-01-01", "0899999999", "username@email.com",
+        "Software Developer", "T33LOL1", "Less than 1 year", registrations,
+        workers=args.workers,
+        engine=args.engine,
+        base_url=base_url + "/",
+        fill_mode=args.fill_mode,
+        entry_mode=args.entry_mode,
+        lean_browser=args.lean_browser,
+        page_load_strategy=args.page_load_strategy,
+        blocked_domains=[],
+        trace_file=args.trace_file,
+        circuit_breaker_threshold=0)
+    quote_handler = axa.QuoteHandler(config)
+    if args.warm_up_browsers and args.engine == "selenium":
+        quote_handler.driver_pool.warm_up()
+    memory_sampler = MemorySampler(quote_handler.driver_pool)
+
+    def get_timed_quote(registration):
+        start = perf_counter()
+        quote = quote_handler.get_quote(config, registration, retry=args.retries, sleep_time=0)
+        return (perf_counter() - start, quote)
+
+    try:
+        memory_sampler.start()
+        with ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="benchmark-worker") as executor:
+            if args.warm_up:
+                logger.info(f"Warming up with {args.warm_up} quote(s)")
+                list(executor.map(get_timed_quote, registrations[:args.warm_up]))
+            commands_before = get_webdriver_command_counts()
+            logger.info(f"Getting {args.quotes} quote(s) with {args.workers} worker(s)")
+            start = perf_counter()
+            results = list(executor.map(get_timed_quote, registrations[args.warm_up:]))
+            duration = perf_counter() - start
+        commands_after = get_webdriver_command_counts()
+    finally:
+        memory_sampler.stop()
+        quote_handler.driver_pool.shutdown()
+        quote_handler.tracer.close()
+        server.shutdown()
+
+    latencies = [latency for latency, quote in results if quote is not None]
+    commands = {command: count - commands_before.get(command, 0) for command, count in commands_after.items()}
+    commands = {command: count for command, count in commands.items() if count}
+    peaks = list(memory_sampler.peaks.values())
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "settings": {
+            "engine": args.engine,
+            "workers": args.workers,
+            "quotes": args.quotes,
+            "warm_up": args.warm_up,
+            "warm_up_browsers": args.warm_up_browsers,
+            "retries": args.retries,
+            "fill_mode": args.fill_mode,
+            "entry_mode": args.entry_mode,
+            "lean_browser": args.lean_browser,
+            "page_load_strategy": args.page_load_strategy,
+            "latency_ms": args.latency_ms,
+            "failure_rate": args.failure_rate,
+        },
+        "succeeded": len(latencies),
+        "failed": len(results) - len(latencies),
+        "duration_seconds": duration,
+        "throughput_quotes_per_minute": len(latencies) / duration * 60 if duration else 0,
+        "latency_seconds": {
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+            "p50": get_percentile(latencies, 50),
+            "p90": get_percentile(latencies, 90),
+            "p95": get_percentile(latencies, 95),
+            "p99": get_percentile(latencies, 99),
+            "max": max(latencies) if latencies else None,
+        },
+        "peak_browser_rss_bytes": {
+            "max": max(peaks) if peaks else None,
+            "mean": sum(peaks) / len(peaks) if peaks else None,
+        },
+        "webdriver_commands": {
+            "total": sum(commands.values()),
+            "per_quote": sum(commands.values()) / len(results) if results else 0,
+            "by_command": commands,
+        },
+    }
+
+# (key path, label) of the results printed and compared
+SUMMARY = [
+    (("succeeded",), "Succeeded"),
+    (("failed",), "Failed"),
+    (("throughput_quotes_per_minute",), "Throughput (quotes/min)"),
+    (("latency_seconds", "p50"), "Latency p50 (s)"),
+    (("latency_seconds", "p95"), "Latency p95 (s)"),
+    (("latency_seconds", "p99"), "Latency p99 (s)"),
+    (("peak_browser_rss_bytes", "max"), "Peak browser RSS (bytes)"),
+    (("webdriver_commands", "per_quote"), "WebDriver commands per quote"),
+]
+
+def _get_value(results, key_path):
+    for key in key_path:
+        results = results.get(key) if results else None
+    return results
+
+def _format_value(value):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+def print_summary(results, previous_results=None):
+    print(f"{'':32} {'this run':>16}" + (f" {'previous run':>16} {'change':>10}" if previous_results else ""))
+    for key_path, label in SUMMARY:
+        value = _get_value(results, key_path)
+        line = f"{label:32} {_format_value(value):>16}"
+        if previous_results:
+            previous_value = _get_value(previous_results, key_path)
+            change = "-"
+            if value is not None and previous_value:
+                change = f"{(value - previous_value) / previous_value * 100:+.1f}%"
+            line += f" {_format_value(previous_value):>16} {change:>10}"
+        print(line)
+
+def get_args():
+    parser = argparse.ArgumentParser("benchmark", description="Benchmark getting quotes against a local mock of the Axa website and save the results so runs can be compared.")
+    parser.add_argument("--engine", dest="engine", help="Engine used to get quotes (default: selenium)", type=str, choices=["selenium", "http"], default="selenium")
+    parser.add_argument("--workers", dest="workers", help="Number of quotes got concurrently (default: 1)", type=int, default=1)
+    parser.add_argument("--quotes", dest="quotes", help="Number of quotes measured (default: 10)", type=int, default=10)
+    parser.add_argument("--warm-up", dest="warm_up", help="Number of quotes got before measuring, e.g. to start the browsers (default: 0)", type=int, default=0)
+    parser.add_argument("--warm-up-browsers", dest="warm_up_browsers", help="Start every browser before measuring", action="store_true")
+    parser.add_argument("--retries", dest="retries", help="Attempts per quote (default: 1)", type=int, default=1)
+    parser.add_argument("--fill-mode", dest="fill_mode", help="How the selenium engine fills in the form (default: sequential)", type=str, choices=["sequential", "batched"], default="sequential")
+    parser.add_argument("--entry-mode", dest="entry_mode", help="How the selenium engine gets to the form (default: homepage)", type=str, choices=["homepage", "deep_link"], default="homepage")
+    parser.add_argument("--lean-browser", dest="lean_browser", help="Use the lean browser profile", action="store_true")
+    parser.add_argument("--page-load-strategy", dest="page_load_strategy", help="WebDriver page load strategy (default: normal)", type=str, choices=["normal", "eager", "none"], default="normal")
+    parser.add_argument("--latency-ms", dest="latency_ms", help="Latency the mock adds to every page load and backend call (default: 100)", type=int, default=100)
+    parser.add_argument("--failure-rate", dest="failure_rate", help="Fraction of backend calls the mock fails (default: 0)", type=float, default=0.0)
+    parser.add_argument("--trace-file", dest="trace_file", help="Write a trace of every quote to this file", type=str, default="")
+    parser.add_argument("--output", dest="output", help="File the results are saved to (default: benchmark-<timestamp>.json)", type=str)
+    parser.add_argument("--compare", dest="compare", help="Results of a previous run to compare with", type=str)
+    return parser.parse_args()
+
+def main():
+    args = get_args()
+    logging.basicConfig(
+        format='%(asctime)s %(levelname)-8s [%(threadName)s] %(message)s',
+        level=logging.WARNING,
+        datefmt='%Y-%m-%d %H:%M:%S')
+    logger = logging.getLogger("benchmark")
+    logger.setLevel(logging.INFO)
+    results = run_benchmark(args, logger)
+    output = args.output or f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json"
+    with open(output, "w") as stream:
+        json.dump(results, stream, indent=2)
+    previous_results = None
+    if args.compare:
+        with open(args.compare) as stream:
+            previous_results = json.load(stream)
+    print_summary(results, previous_results)
+    logger.info(f"Saved results to '{output}'")
+
+if __name__ == "__main__":
+    main()
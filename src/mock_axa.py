@@ -0,0 +1,518 @@
+#!/usr/local/bin/python
+
+import argparse
+import hashlib
+import json
+import logging
+import random
+import threading
+import uuid
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+from urllib.parse import urlparse
+
+# Local stand-in for the Axa website, used to benchmark and test axa without
+# hitting the live site. It serves the pages and element IDs the selenium
+# engine walks through and the backend endpoints the http engine posts to,
+# with configurable latency and failure injection.
+
+CONSENT_COOKIE = "_evidon_consent_cookie"
+
+# Answers required by each backend endpoint, in the order the form sends them
+REQUIRED_FIELDS = {
+    "start": [],
+    "vehicle-lookup": ["vehicleRegistrationNumber"],
+    "vehicle-details": ["vehicleId", "isVehicleForBusinessUse", "isVehicleForCommutingUse", "annualDistanceDriven"],
+    "proposer-details": ["firstName", "lastName", "dateOfBirth", "emailAddress", "phoneNumber", "occupation", "eirCode", "householdType"],
+    "driving-history": ["drivingLicenceType", "advancedDriverTraining", "yearsLicenceHeld", "hasPenaltyPoints", "drivingExperience"],
+    "cover-details": ["hasMultiProductDiscount", "confirmAssumptions"],
+    "quote": [],
+    "save": [],
+}
+QUOTE_STEPS = ["vehicle-lookup", "vehicle-details", "proposer-details", "driving-history", "cover-details"]
+
+COOKIE_BANNER = """
+<div id="_evidon_banner">
+  <p>We use cookies to improve your experience.</p>
+  <button id="_evidon-accept-button" type="button">Accept</button>
+</div>
+<script>
+  document.getElementById("_evidon-accept-button").addEventListener("click", function () {
+    document.cookie = "%(cookie)s=accepted; path=/; max-age=31536000";
+    document.getElementById("_evidon_banner").remove();
+  });
+</script>
+""" % {"cookie": CONSENT_COOKIE}
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>%(title)s</title></head>
+<body>
+%(banner)s
+%(body)s
+</body>
+</html>
+"""
+
+HOMEPAGE = """
+<h1>Mock Axa</h1>
+<nav><a href="/car-insurance/">Car Insurance</a></nav>
+"""
+
+CAR_INSURANCE_PAGE = """
+<h1>Car Insurance</h1>
+<a href="/car-insurance/get-a-quote/">Get a car insurance quote</a>
+"""
+
+# Sections of the form only exist in the DOM once revealed, like the React
+# form, so the waits in axa are exercised
+QUOTE_FORM_PAGE = """
+<h1>Get a car insurance quote</h1>
+<form id="quote-form" onsubmit="return false">
+  <div id="registration-section">
+    <p>Do you know the car's registration number?</p>
+    <label><input type="radio" name="HasRegNumber" id="VehicleDetails.HasRegNumber1"> Yes</label>
+    <label><input type="radio" name="HasRegNumber" id="VehicleDetails.HasRegNumber2"> No</label>
+  </div>
+  <div id="lookup-section"></div>
+  <div id="car-section"></div>
+  <div id="details-section"></div>
+  <div id="result-section"></div>
+</form>
+
+<template id="lookup-template">
+  <input type="text" id="VehicleDetails.VehicleRegistrationNumber">
+  <button type="button" id="find-car-btn">Find car</button>
+</template>
+
+<template id="car-template">
+  <label>Is this the correct car?</label><span><div id="car-name"></div></span>
+  <label><input type="radio" name="ConfirmCarSearch" id="VehicleDetails.ConfirmCarSearchBtn1"> Yes</label>
+  <label><input type="radio" name="ConfirmCarSearch" id="VehicleDetails.ConfirmCarSearchBtn2"> No</label>
+</template>
+
+<template id="not-found-template">
+  <p class="error">Sorry, we couldn't find a car with that registration.</p>
+</template>
+
+<template id="details-template">
+  <p>Will this car be used for business purposes?</p>
+  <label><input type="radio" name="BusinessUse" id="VehicleDetails.IsVehicleForBusinessUse1"> Yes</label>
+  <label><input type="radio" name="BusinessUse" id="VehicleDetails.IsVehicleForBusinessUse2"> No</label>
+  <p>Will this car be used for commuting to work?</p>
+  <label><input type="radio" name="CommutingUse" id="VehicleDetails.IsVehicleForCommutingUse1"> Yes</label>
+  <label><input type="radio" name="CommutingUse" id="VehicleDetails.IsVehicleForCommutingUse2"> No</label>
+  <select id="VehicleDetails.AnnualDistanceDrivenTypeId">
+    <option value="">Please select</option>
+    <option value="1">Up to 10,000 km</option>
+    <option value="2">10,001 - 20,000 km</option>
+    <option value="3">20,001 - 30,000 km</option>
+    <option value="4">Over 30,000 km</option>
+  </select>
+
+  <label><input type="radio" name="Title" id="ProposerDetails.TitleTypeId1"> Mr</label>
+  <label><input type="radio" name="Title" id="ProposerDetails.TitleTypeId2"> Ms</label>
+  <input type="text" id="ProposerDetails.FirstName">
+  <input type="text" id="ProposerDetails.LastName">
+  <input type="text" id="ProposerDetails.DateOfBirth.Day">
+  <input type="text" id="ProposerDetails.DateOfBirth.Month">
+  <input type="text" id="ProposerDetails.DateOfBirth.Year">
+  <input type="text" id="ProposerDetails.EmailAddress">
+  <input type="text" name="phone-number">
+  <label><input type="radio" name="EmploymentStatus" id="ProposerDetails.EmploymentStatusTypeId1"> Employed</label>
+  <label><input type="radio" name="EmploymentStatus" id="ProposerDetails.EmploymentStatusTypeId2"> Unemployed</label>
+  <div class="autocomplete"><input type="text" id="ProposerDetails.OccupationTypeDescription" autocomplete="off"></div>
+  <div class="autocomplete"><input type="text" id="ProposerDetails.AddressDisplayFormatted" autocomplete="off"></div>
+  <label><input type="radio" name="HouseHold" id="ProposerDetails.HouseHoldTypeId1"> Rented accommodation</label>
+  <label><input type="radio" name="HouseHold" id="ProposerDetails.HouseHoldTypeId2"> Owned</label>
+
+  <label><input type="radio" name="Licence" id="DrivingHistory.DrivingLicenceTypeId1"> ROI (Full)</label>
+  <label><input type="radio" name="Licence" id="DrivingHistory.DrivingLicenceTypeId2"> ROI (Provisional)</label>
+  <label><input type="radio" name="Training" id="DrivingHistory.AdvancedDriverTrainingTypeId1"> Yes</label>
+  <label><input type="radio" name="Training" id="DrivingHistory.AdvancedDriverTrainingTypeId2"> No</label>
+  <select id="DrivingHistory.YearsLicenceHeldTypeId">
+    <option value="">Please select</option>
+    <option value="1">Less than 1 year</option>
+    <option value="2">1 year</option>
+    <option value="3">2 years</option>
+    <option value="4">3 years or more</option>
+  </select>
+  <label><input type="radio" name="PenaltyPoints" id="DrivingHistory.PenaltyPointsDetails.HasPenaltyPoints1"> Yes</label>
+  <label><input type="radio" name="PenaltyPoints" id="DrivingHistory.PenaltyPointsDetails.HasPenaltyPoints2"> No</label>
+  <label><input type="radio" name="Experience" id="DrivingHistory.DrivingExperienceTypeId1"> Insured in my own name</label>
+  <label><input type="radio" name="Experience" id="DrivingHistory.DrivingExperienceTypeId2"> No previous insurance</label>
+  <label><input type="radio" name="MultiProduct" id="CoverDetails.HasMultiProductDiscount1"> Yes</label>
+  <label><input type="radio" name="MultiProduct" id="CoverDetails.HasMultiProductDiscount2"> No</label>
+
+  <label><input type="checkbox" id="ConfirmAssumptions"> I have read and accept the assumptions.</label>
+  <button type="button" id="getquote-btn">Get quote</button>
+  <p id="form-error"></p>
+</template>
+
+<template id="result-template">
+  <div id="YourQuote.Quote"><div><div><span><div><div><div>Annual premium</div><div id="premium"></div></div></div></span></div></div></div>
+  <p>Quote reference: <span id="CarQuotePremium.QuoteReferenceIdForDisplay"></span></p>
+  <button type="button" id="save-quote-btn">Save Quote</button>
+  <p id="save-status"></p>
+</template>
+
+<script>
+  var quoteId = null;
+  var started = null;
+  var vehicle = null;
+  var byId = function (id) { return document.getElementById(id); };
+
+  function reveal(sectionId, templateId) {
+    var section = byId(sectionId);
+    section.innerHTML = "";
+    section.appendChild(byId(templateId).content.cloneNode(true));
+  }
+
+  function checked(id) {
+    return byId(id).checked;
+  }
+
+  function selectedText(id) {
+    var select = byId(id);
+    return select.selectedIndex > 0 ? select.options[select.selectedIndex].text : "";
+  }
+
+  async function api(path, payload) {
+    if (path !== "start") {
+      await started;
+    }
+    var response = await fetch("/api/car-quote/" + path, {
+      method: "POST",
+      headers: {"Content-Type": "application/json"},
+      body: JSON.stringify(Object.assign({quoteId: quoteId}, payload)),
+    });
+    if (!response.ok) {
+      throw new Error(path + " failed with status " + response.status);
+    }
+    return response.json();
+  }
+
+  function showSuggestion(input, text) {
+    removeSuggestions();
+    var list = document.createElement("ul");
+    list.id = "suggestions";
+    var item = document.createElement("li");
+    item.id = "react-autowhatever-1--item-0";
+    item.textContent = text;
+    item.addEventListener("click", function () {
+      input.value = text;
+      input.dataset.selected = "true";
+      removeSuggestions();
+    });
+    list.appendChild(item);
+    input.parentNode.appendChild(list);
+  }
+
+  function removeSuggestions() {
+    var list = byId("suggestions");
+    if (list) {
+      list.remove();
+    }
+  }
+
+  async function findCar() {
+    var registration = byId("VehicleDetails.VehicleRegistrationNumber").value.trim();
+    var response = await api("vehicle-lookup", {hasRegNumber: true, vehicleRegistrationNumber: registration});
+    if (!response.vehicle) {
+      reveal("car-section", "not-found-template");
+      return;
+    }
+    vehicle = response.vehicle;
+    reveal("car-section", "car-template");
+    byId("car-name").textContent = vehicle.description;
+  }
+
+  async function getQuote() {
+    var error = byId("form-error");
+    var required = {
+      "business use": checked("VehicleDetails.IsVehicleForBusinessUse2") || checked("VehicleDetails.IsVehicleForBusinessUse1"),
+      "commuting use": checked("VehicleDetails.IsVehicleForCommutingUse1") || checked("VehicleDetails.IsVehicleForCommutingUse2"),
+      "annual distance": selectedText("VehicleDetails.AnnualDistanceDrivenTypeId"),
+      "first name": byId("ProposerDetails.FirstName").value,
+      "last name": byId("ProposerDetails.LastName").value,
+      "email": byId("ProposerDetails.EmailAddress").value,
+      "phone number": document.querySelector("input[name='phone-number']").value,
+      "occupation": byId("ProposerDetails.OccupationTypeDescription").dataset.selected,
+      "address": byId("ProposerDetails.AddressDisplayFormatted").dataset.selected,
+      "licence held": selectedText("DrivingHistory.YearsLicenceHeldTypeId"),
+      "assumptions": checked("ConfirmAssumptions"),
+    };
+    var missing = Object.keys(required).filter(function (key) { return !required[key]; });
+    if (missing.length) {
+      error.textContent = "Please answer: " + missing.join(", ");
+      return;
+    }
+    error.textContent = "";
+    try {
+      await api("vehicle-details", {
+        vehicleId: vehicle.id,
+        confirmCar: true,
+        isVehicleForBusinessUse: checked("VehicleDetails.IsVehicleForBusinessUse1"),
+        isVehicleForCommutingUse: checked("VehicleDetails.IsVehicleForCommutingUse1"),
+        annualDistanceDriven: selectedText("VehicleDetails.AnnualDistanceDrivenTypeId"),
+      });
+      await api("proposer-details", {
+        title: checked("ProposerDetails.TitleTypeId1") ? "MR" : "MS",
+        firstName: byId("ProposerDetails.FirstName").value,
+        lastName: byId("ProposerDetails.LastName").value,
+        dateOfBirth: [byId("ProposerDetails.DateOfBirth.Year").value, byId("ProposerDetails.DateOfBirth.Month").value, byId("ProposerDetails.DateOfBirth.Day").value].join("-"),
+        emailAddress: byId("ProposerDetails.EmailAddress").value,
+        phoneNumber: document.querySelector("input[name='phone-number']").value,
+        employmentStatus: checked("ProposerDetails.EmploymentStatusTypeId1") ? "EMPLOYED" : "UNEMPLOYED",
+        occupation: byId("ProposerDetails.OccupationTypeDescription").value,
+        eirCode: byId("ProposerDetails.AddressDisplayFormatted").value,
+        householdType: checked("ProposerDetails.HouseHoldTypeId1") ? "RENTED_ACCOMMODATION" : "OWNED",
+      });
+      await api("driving-history", {
+        drivingLicenceType: checked("DrivingHistory.DrivingLicenceTypeId2") ? "ROI_PROVISIONAL" : "ROI_FULL",
+        advancedDriverTraining: checked("DrivingHistory.AdvancedDriverTrainingTypeId1"),
+        yearsLicenceHeld: selectedText("DrivingHistory.YearsLicenceHeldTypeId"),
+        hasPenaltyPoints: checked("DrivingHistory.PenaltyPointsDetails.HasPenaltyPoints1"),
+        drivingExperience: checked("DrivingHistory.DrivingExperienceTypeId2") ? "NO_PREVIOUS_INSURANCE" : "INSURED",
+      });
+      await api("cover-details", {
+        hasMultiProductDiscount: checked("CoverDetails.HasMultiProductDiscount1"),
+        confirmAssumptions: true,
+      });
+      var quote = await api("quote", {});
+      reveal("result-section", "result-template");
+      byId("premium").textContent = quote.premium;
+      byId("CarQuotePremium.QuoteReferenceIdForDisplay").textContent = quote.quoteReferenceId;
+    } catch (e) {
+      error.textContent = "Something went wrong: " + e.message;
+    }
+  }
+
+  document.addEventListener("change", function (event) {
+    var id = event.target.id;
+    if (id === "VehicleDetails.HasRegNumber1") {
+      reveal("lookup-section", "lookup-template");
+    } else if (id === "VehicleDetails.ConfirmCarSearchBtn1") {
+      reveal("details-section", "details-template");
+    }
+  });
+
+  document.addEventListener("input", function (event) {
+    var input = event.target;
+    if (input.id === "ProposerDetails.OccupationTypeDescription") {
+      input.dataset.selected = "";
+      if (input.value) {
+        showSuggestion(input, input.value);
+      }
+    } else if (input.id === "ProposerDetails.AddressDisplayFormatted") {
+      // the Eircode lookup takes a round trip on the real site
+      input.dataset.selected = "";
+      var value = input.value;
+      setTimeout(function () {
+        if (input.value === value && value) {
+          showSuggestion(input, value + ", Mock Street, Mock Town");
+        }
+      }, %(autocomplete_delay_ms)d);
+    }
+  });
+
+  document.addEventListener("click", function (event) {
+    var id = event.target.id;
+    if (id === "find-car-btn") {
+      findCar().catch(function (e) { console.error(e); });
+    } else if (id === "getquote-btn") {
+      getQuote();
+    } else if (id === "save-quote-btn") {
+      api("save", {}).then(function () { byId("save-status").textContent = "Quote saved"; });
+    }
+  });
+
+  started = api("start", {}).then(function (response) { quoteId = response.quoteId; });
+</script>
+"""
+
+class MockAxa:
+    def __init__(self, logger, latency_ms=0, failure_rate=0.0, not_found_registrations=()):
+        self._logger = logger
+        self._latency_ms = latency_ms
+        self._failure_rate = failure_rate
+        self._not_found_registrations = set(not_found_registrations)
+        self._lock = threading.Lock()
+        self._quotes = {}
+        self._requests = []
+
+    @property
+    def logger(self):
+        return self._logger
+
+    @property
+    def latency_ms(self):
+        return self._latency_ms
+
+    @property
+    def failure_rate(self):
+        return self._failure_rate
+
+    def get_requests(self):
+        with self._lock:
+            return list(self._requests)
+
+    def reset(self):
+        with self._lock:
+            self._quotes.clear()
+            self._requests.clear()
+
+    def wait(self):
+        if self._latency_ms:
+            sleep(self._latency_ms/1000)
+
+    def should_fail(self):
+        return self._failure_rate and random.random() < self._failure_rate
+
+    def render_page(self, path, cookies):
+        banner = "" if CONSENT_COOKIE in cookies else COOKIE_BANNER
+        if path == "/":
+            return PAGE % {"title": "Axa", "banner": banner, "body": HOMEPAGE}
+        if path == "/car-insurance/":
+            return PAGE % {"title": "Car Insurance", "banner": banner, "body": CAR_INSURANCE_PAGE}
+        if path == "/car-insurance/get-a-quote/":
+            body = QUOTE_FORM_PAGE % {"autocomplete_delay_ms": max(50, self._latency_ms//2)}
+            return PAGE % {"title": "Get a quote", "banner": banner, "body": body}
+        return None
+
+    def _get_price(self, quote):
+        # the same answers always get the same price
+        answers = json.dumps([quote["registration"], quote["answers"]], sort_keys=True)
+        cents = int(hashlib.sha256(answers.encode()).hexdigest(), 16) % 100000
+        return 300 + cents/100
+
+    def handle_api(self, endpoint, payload):
+        # returns (status, response)
+        missing = [field for field in REQUIRED_FIELDS[endpoint] if field not in payload]
+        if missing:
+            return (400, {"error": f"missing fields {missing}"})
+        with self._lock:
+            self._requests.append(endpoint)
+            if endpoint == "start":
+                quote_id = uuid.uuid4().hex
+                self._quotes[quote_id] = {"registration": None, "steps": [], "answers": {}, "reference_id": None}
+                return (200, {"quoteId": quote_id})
+            quote = self._quotes.get(payload.get("quoteId"))
+            if quote is None:
+                return (404, {"error": "unknown quote"})
+            if endpoint in QUOTE_STEPS:
+                quote["steps"].append(endpoint)
+                quote["answers"][endpoint] = {key: value for key, value in payload.items() if key != "quoteId"}
+            if endpoint == "vehicle-lookup":
+                registration = payload["vehicleRegistrationNumber"].replace(" ", "").upper()
+                if registration in self._not_found_registrations:
+                    return (200, {"vehicle": None})
+                quote["registration"] = registration
+                return (200, {"vehicle": {"id": f"vehicle-{registration}", "description": f"MOCK MOTORS {registration[-3:]} 1.2 PETROL"}})
+            if endpoint == "quote":
+                if quote["steps"][-len(QUOTE_STEPS):] != QUOTE_STEPS:
+                    return (409, {"error": f"form answered out of order: {quote['steps']}"})
+                quote["reference_id"] = f"MCK{int(hashlib.sha256(payload['quoteId'].encode()).hexdigest(), 16) % 10**7:07d}"
+                return (200, {"premium": f"€{self._get_price(quote):,.2f}", "quoteReferenceId": quote["reference_id"]})
+            if endpoint == "save":
+                if quote["reference_id"] is None:
+                    return (409, {"error": "no quote to save"})
+                return (200, {"saved": True})
+            return (200, {"quoteId": payload["quoteId"]})
+
+def get_request_handler(mock):
+    class MockAxaRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status, body, content_type):
+            body = body.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, status, response):
+            self._send(status, json.dumps(response), "application/json")
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == "/__mock__/requests":
+                self._send_json(200, mock.get_requests())
+                return
+            if path.startswith("/__mock__/") or path.startswith("/favicon"):
+                self._send(404, "", "text/plain")
+                return
+            mock.wait()
+            cookies = self.headers.get("Cookie", "")
+            page = mock.render_page(path, cookies)
+            if page is None:
+                self._send(404, "Not found", "text/plain")
+            else:
+                self._send(200, page, "text/html; charset=utf-8")
+
+        def do_POST(self):
+            path = urlparse(self.path).path
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length) if length else b""
+            if path == "/__mock__/reset":
+                mock.reset()
+                self._send_json(200, {})
+                return
+            if not path.startswith("/api/car-quote/") or path.rsplit("/", 1)[1] not in REQUIRED_FIELDS:
+                self._send_json(404, {"error": "not found"})
+                return
+            mock.wait()
+            if mock.should_fail():
+                self._send_json(500, {"error": "injected failure"})
+                return
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                self._send_json(400, {"error": "invalid JSON"})
+                return
+            status, response = mock.handle_api(path.rsplit("/", 1)[1], payload)
+            self._send_json(status, response)
+
+        def log_message(self, format, *args):
+            mock.logger.debug(f"{self.address_string()} {format % args}")
+
+    return MockAxaRequestHandler
+
+def start_mock_server(mock, port=0, address="127.0.0.1"):
+    # port 0 picks a free port, read it back from server.server_port
+    server = ThreadingHTTPServer((address, port), get_request_handler(mock))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="mock-axa", daemon=True)
+    thread.start()
+    mock.logger.info(f"Mock Axa website running on http://{address}:{server.server_port}/")
+    return server
+
+def get_args():
+    parser = argparse.ArgumentParser("mock_axa", description="Local mock of the Axa car insurance quote website and its backend, for benchmarking and testing axa without hitting the live site.")
+    parser.add_argument("--port", dest="port", help="Port to listen on (default: 8080)", type=int, default=8080)
+    parser.add_argument("--address", dest="address", help="Address to listen on (default: 127.0.0.1)", type=str, default="127.0.0.1")
+    parser.add_argument("--latency-ms", dest="latency_ms", help="Artificial latency added to every page load and backend call (default: 0)", type=int, default=0)
+    parser.add_argument("--failure-rate", dest="failure_rate", help="Fraction of backend calls that fail with a 500 (default: 0)", type=float, default=0.0)
+    parser.add_argument("--not-found-registrations", dest="not_found_registrations", help="Registrations the vehicle lookup finds nothing for", type=str, action="extend", nargs="+", default=[])
+    return parser.parse_args()
+
+def main():
+    args = get_args()
+    logging.basicConfig(
+        format='%(asctime)s %(levelname)-8s [%(threadName)s] %(message)s',
+        level=logging.INFO,
+        datefmt='%Y-%m-%d %H:%M:%S')
+    mock = MockAxa(logging.getLogger(__name__),
+        latency_ms=args.latency_ms,
+        failure_rate=args.failure_rate,
+        not_found_registrations=args.not_found_registrations)
+    server = start_mock_server(mock, port=args.port, address=args.address)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import logging
+import os
+import sys
+
+import pytest
+
+from prometheus_client import REGISTRY
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+@pytest.fixture(autouse=True)
+def unregister_metrics():
+    # The classes create their metrics when constructed, so the ones a test
+    # created are unregistered again for the next test to create them. A test
+    # can also call it to construct the same classes again, like after a restart.
+    collectors = set(REGISTRY._collector_to_names)
+    def unregister():
+        for collector in list(REGISTRY._collector_to_names):
+            if collector not in collectors:
+                REGISTRY.unregister(collector)
+    yield unregister
+    unregister()
+
+@pytest.fixture
+def registry():
+    return REGISTRY
+
+@pytest.fixture
+def logger():
+    return logging.getLogger("tests")
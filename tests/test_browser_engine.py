@@ -0,0 +1,39 @@
+import shutil
+
+import pytest
+
+import axa
+import mock_axa
+
+pytestmark = pytest.mark.skipif(shutil.which("chromedriver") is None, reason="needs chromedriver and Chrome on the PATH")
+
+@pytest.fixture
+def mock(logger):
+    return mock_axa.MockAxa(logger)
+
+@pytest.fixture
+def mock_url(mock):
+    server = mock_axa.start_mock_server(mock)
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+@pytest.mark.parametrize("fill_mode", ["sequential", "batched"])
+def test_browser_engine_fills_the_mock_form(logger, mock_url, registry, fill_mode):
+    config = axa.Config("Up to 10,000 km", "John", "Doe", "1950-01-01", "0899999999", "username@email.com",
+        "Software Developer", "T33LOL1", "Less than 1 year", ["11L80085"],
+        fill_mode=fill_mode,
+        base_url=mock_url + "/",
+        chromedriver_path="",
+        circuit_breaker_threshold=0)
+    quote_handler = axa.QuoteHandler(config)
+    try:
+        quote = quote_handler.get_quote(config, "11L80085", retry=1, sleep_time=0)
+    finally:
+        quote_handler.driver_pool.shutdown()
+        quote_handler.tracer.close()
+        quote_handler.vehicle_cache.close()
+
+    assert quote.car_name == "MOCK MOTORS 085 1.2 PETROL"
+    assert quote.reference_id.startswith("MCK")
+    assert registry.get_sample_value("quote_prices", {"profile": "default", "registration": "11L80085", "car_name": quote.car_name}) == quote.price
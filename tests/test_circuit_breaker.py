@@ -0,0 +1,63 @@
+import threading
+
+from time import perf_counter
+
+import axa
+
+def test_opens_after_the_threshold_of_failures_in_a_row(logger):
+    circuit_breaker = axa.CircuitBreaker(logger, failure_threshold=3, cooldown_seconds=60)
+
+    circuit_breaker.record_failure()
+    circuit_breaker.record_failure()
+    circuit_breaker.record_success()
+    circuit_breaker.record_failure()
+    circuit_breaker.record_failure()
+    assert circuit_breaker.state == axa.CircuitBreaker.CLOSED
+
+    circuit_breaker.record_failure()
+    assert circuit_breaker.state == axa.CircuitBreaker.OPEN
+
+def test_a_threshold_of_zero_never_opens(logger):
+    circuit_breaker = axa.CircuitBreaker(logger, failure_threshold=0)
+
+    for _ in range(10):
+        circuit_breaker.record_failure()
+    assert circuit_breaker.state == axa.CircuitBreaker.CLOSED
+    assert circuit_breaker.wait_until_closed() < 0.1
+
+def test_lets_a_single_probe_through_after_the_cooldown(logger):
+    circuit_breaker = axa.CircuitBreaker(logger, failure_threshold=1, cooldown_seconds=0.2)
+    circuit_breaker.record_failure()
+
+    waited = circuit_breaker.wait_until_closed()
+    assert waited >= 0.15
+    assert circuit_breaker.state == axa.CircuitBreaker.HALF_OPEN
+
+    # a second worker waits for the probe
+    done = threading.Event()
+    threading.Thread(target=lambda: (circuit_breaker.wait_until_closed(), done.set()), daemon=True).start()
+    assert not done.wait(0.1)
+    circuit_breaker.record_success()
+    assert done.wait(1)
+    assert circuit_breaker.state == axa.CircuitBreaker.CLOSED
+
+def test_a_failed_probe_opens_it_for_another_cooldown(logger):
+    circuit_breaker = axa.CircuitBreaker(logger, failure_threshold=1, cooldown_seconds=0.2)
+    circuit_breaker.record_failure()
+    circuit_breaker.wait_until_closed()
+
+    circuit_breaker.record_failure()
+    assert circuit_breaker.state == axa.CircuitBreaker.OPEN
+    start = perf_counter()
+    circuit_breaker.wait_until_closed()
+    assert perf_counter() - start >= 0.15
+
+def test_stopping_wakes_the_workers_waiting_for_it(logger):
+    circuit_breaker = axa.CircuitBreaker(logger, failure_threshold=1, cooldown_seconds=60)
+    circuit_breaker.record_failure()
+    done = threading.Event()
+    threading.Thread(target=lambda: (circuit_breaker.wait_until_closed(), done.set()), daemon=True).start()
+    assert not done.wait(0.1)
+
+    circuit_breaker.stop()
+    assert done.wait(1)
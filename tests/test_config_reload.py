@@ -0,0 +1,170 @@
+import sys
+import threading
+
+from time import sleep, time
+
+import pytest
+import yaml
+
+import axa
+import mock_axa
+
+class HoldingMockAxa(mock_axa.MockAxa):
+    # Holds the first quote until released, so the config can be reloaded
+    # while it is in flight
+    def __init__(self, logger):
+        super().__init__(logger)
+        self.held = threading.Event()
+        self.released = threading.Event()
+
+    def handle_api(self, endpoint, payload):
+        if endpoint == "quote" and not self.held.is_set():
+            self.held.set()
+            self.released.wait(10)
+        return super().handle_api(endpoint, payload)
+
+@pytest.fixture
+def mock(logger):
+    mock = HoldingMockAxa(logger)
+    mock.released.set()
+    return mock
+
+@pytest.fixture
+def mock_url(mock):
+    server = mock_axa.start_mock_server(mock)
+    yield f"http://127.0.0.1:{server.server_port}"
+    mock.released.set()
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def get_config_values(mock_url):
+    def get_config_values(**values):
+        config_values = {
+            "annual_distance": "Up to 10,000 km",
+            "first_name": "John",
+            "last_name": "Doe",
+            "date_of_birth": "1950-01-01",
+            "phone_number": "0899999999",
+            "email": "username@email.com",
+            "occupation": "Software Developer",
+            "eir_code": "T33LOL1",
+            "license_held": "Less than 1 year",
+            "prometheus_client_port": "8000",
+            "engine": "http",
+            "base_url": mock_url + "/",
+            "workers": "2",
+            "shard_index": "0",
+            "monitor_interval_seconds": "3600",
+            "min_monitor_interval_seconds": "3600",
+            "max_monitor_interval_seconds": "3600",
+            "circuit_breaker_threshold": "0",
+            "registrations": ["11L80085"],
+        }
+        config_values.update(values)
+        return config_values
+    return get_config_values
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    path = tmp_path / "config.yaml"
+    monkeypatch.setattr(sys, "argv", ["axa", "--config-file", str(path)])
+    return path
+
+@pytest.fixture
+def load_config(config_file):
+    def load_config(config_values):
+        config_file.write_text(yaml.safe_dump(config_values))
+        return axa.load_config(axa.get_args())[0]
+    return load_config
+
+@pytest.fixture
+def monitor():
+    # Runs the monitor loop of a quote handler until the test is done
+    quote_handlers = []
+    def monitor(quote_handler, config):
+        jobs = quote_handler.plan_jobs(config)
+        threading.Thread(target=quote_handler.monitor_forever, args=(config, jobs), daemon=True).start()
+        quote_handlers.append(quote_handler)
+        return jobs
+    yield monitor
+    for quote_handler in quote_handlers:
+        quote_handler.stop()
+        join_quote_workers()
+        quote_handler.tracer.close()
+        quote_handler.vehicle_cache.close()
+
+def join_quote_workers():
+    for thread in threading.enumerate():
+        if thread.name.startswith("quote-worker"):
+            thread.join(10)
+
+def get_price(registry, registration, profile="default"):
+    return registry.get_sample_value("quote_prices", {"profile": profile, "registration": registration,
+        "car_name": f"MOCK MOTORS {registration[-3:]} 1.2 PETROL"})
+
+def wait_for(condition, timeout=10):
+    deadline = time() + timeout
+    while not condition():
+        assert time() < deadline, "timed out waiting for the condition"
+        sleep(0.05)
+
+def test_reload_unschedules_removed_registrations_and_quotes_new_ones(get_config_values, load_config, monitor, registry):
+    config = load_config(get_config_values(registrations=["11L80085", "08C100"]))
+    quote_handler = axa.QuoteHandler(config)
+    first, second = monitor(quote_handler, config)
+    wait_for(lambda: get_price(registry, "11L80085") is not None)
+
+    quote_handler.reload_config(load_config(get_config_values(registrations=["08C100", "12D1000"])))
+
+    assert get_price(registry, "11L80085") is None
+    assert not quote_handler.scheduler.has_job(first)
+    # kept with its schedule, it is not due yet
+    assert quote_handler.scheduler.has_job(second)
+    wait_for(lambda: get_price(registry, "12D1000") is not None)
+    assert get_price(registry, "08C100") is None
+
+def test_reload_keeps_the_price_of_an_edited_profile_from_a_quote_still_running(get_config_values, load_config, monitor, mock, registry):
+    mock.released.clear()
+    config = load_config(get_config_values())
+    quote_handler = axa.QuoteHandler(config)
+    monitor(quote_handler, config)
+    assert mock.held.wait(10)
+
+    quote_handler.reload_config(load_config(get_config_values(date_of_birth="1960-01-01")))
+    wait_for(lambda: get_price(registry, "11L80085") is not None)
+    price = get_price(registry, "11L80085")
+    # the quote for the old answers finishes after the new one
+    mock.released.set()
+    wait_for(lambda: mock.get_requests().count("save") == 2)
+    quote_handler.stop()
+    join_quote_workers()
+
+    assert get_price(registry, "11L80085") == price
+
+def test_config_watcher_applies_a_changed_file(get_config_values, load_config, config_file, monitor, registry, logger, caplog):
+    config = load_config(get_config_values())
+    quote_handler = axa.QuoteHandler(config)
+    monitor(quote_handler, config)
+    config_watcher = axa.ConfigWatcher(logger, str(config_file), lambda: axa.load_config(axa.get_args())[0], quote_handler.reload_config)
+    assert not config_watcher.check()
+
+    config_file.write_text(yaml.safe_dump(get_config_values(workers="3", registrations=["11L80085", "08C100"])))
+
+    assert config_watcher.check()
+    assert registry.get_sample_value("config_reloads_total") == 1
+    assert "Config 'workers' changed, it is only applied after a restart" in caplog.text
+    wait_for(lambda: get_price(registry, "08C100") is not None)
+
+def test_config_watcher_skips_an_invalid_file(get_config_values, load_config, config_file, monitor, registry, logger):
+    config = load_config(get_config_values())
+    quote_handler = axa.QuoteHandler(config)
+    jobs = monitor(quote_handler, config)
+    config_watcher = axa.ConfigWatcher(logger, str(config_file), lambda: axa.load_config(axa.get_args())[0], quote_handler.reload_config)
+
+    config_file.write_text(yaml.safe_dump(get_config_values(workers="0", registrations=["08C100"])))
+
+    assert not config_watcher.check()
+    assert registry.get_sample_value("config_validation_failures_total") == 1
+    assert registry.get_sample_value("config_reloads_total") == 0
+    assert quote_handler.scheduler.has_job(jobs[0])
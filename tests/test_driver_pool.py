@@ -0,0 +1,97 @@
+import os
+
+from types import SimpleNamespace
+
+import pytest
+
+import axa
+
+class FakeDriver:
+    # Stands in for a Chrome driver, the RSS read is of this process
+    def __init__(self):
+        self.service = SimpleNamespace(process=SimpleNamespace(pid=os.getpid()))
+        self.urls = []
+        self.quit_count = 0
+
+    def get(self, url):
+        self.urls.append(url)
+
+    def execute_script(self, script):
+        pass
+
+    def execute_cdp_cmd(self, cmd, params):
+        pass
+
+    def quit(self):
+        self.quit_count += 1
+
+@pytest.fixture
+def drivers():
+    return []
+
+@pytest.fixture
+def create_driver(drivers):
+    def create_driver():
+        driver = FakeDriver()
+        drivers.append(driver)
+        return driver
+    return create_driver
+
+def test_browsers_are_reused_until_max_uses(create_driver, drivers, logger, registry):
+    driver_pool = axa.DriverPool(create_driver, logger, max_uses=2, start_url="http://start")
+    with driver_pool.driver() as first:
+        pass
+    with driver_pool.driver() as second:
+        pass
+    with driver_pool.driver() as third:
+        pass
+
+    assert first is second and third is not first
+    assert first.quit_count == 1 and third.quit_count == 0
+    assert first.urls == ["http://start", "http://start"]
+    assert registry.get_sample_value("driver_pool_recycles_total", {"reason": "max_uses"}) == 1
+
+def test_browsers_are_recycled_above_max_rss(create_driver, drivers, logger, registry):
+    driver_pool = axa.DriverPool(create_driver, logger, max_rss_bytes=1)
+    with driver_pool.driver():
+        pass
+    with driver_pool.driver():
+        pass
+
+    assert [driver.quit_count for driver in drivers] == [1, 1]
+    assert registry.get_sample_value("driver_pool_recycles_total", {"reason": "max_rss"}) == 2
+
+def test_browsers_are_discarded_when_the_quote_fails(create_driver, drivers, logger, registry):
+    driver_pool = axa.DriverPool(create_driver, logger)
+    with pytest.raises(ValueError):
+        with driver_pool.driver():
+            raise ValueError("quote failed")
+    with driver_pool.driver():
+        pass
+
+    assert [driver.quit_count for driver in drivers] == [1, 0]
+    assert registry.get_sample_value("driver_pool_recycles_total", {"reason": "failure"}) == 1
+    assert registry.get_sample_value("driver_pool_size") == 1
+
+def test_shutdown_tears_down_every_browser(create_driver, drivers, logger, registry):
+    driver_pool = axa.DriverPool(create_driver, logger, size=2)
+    idle, in_use = driver_pool.acquire(), driver_pool.acquire()
+    driver_pool.release(idle)
+
+    driver_pool.shutdown()
+    driver_pool.release(in_use)
+
+    assert [driver.quit_count for driver in drivers] == [1, 1]
+    assert registry.get_sample_value("driver_pool_size") == 0
+    with pytest.raises(RuntimeError):
+        driver_pool.acquire()
+
+def test_browsers_started_during_shutdown_are_quit(drivers, create_driver, logger):
+    driver_pool = None
+    def prepare_driver(driver):
+        driver_pool.shutdown()
+    driver_pool = axa.DriverPool(create_driver, logger, prepare_driver=prepare_driver)
+
+    with pytest.raises(RuntimeError):
+        driver_pool.acquire()
+    assert [driver.quit_count for driver in drivers] == [1]
@@ -0,0 +1,122 @@
+import json
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import axa
+
+QUOTE_ID = "quote-1"
+
+class RecordingStub:
+    # Answers every endpoint of the http engine and records the requests in
+    # the order they were received
+    def __init__(self, vehicle=True):
+        self.requests = []
+        self.vehicle = vehicle
+
+    def respond(self, path, payload):
+        self.requests.append((path, payload))
+        if path == axa.HttpQuoteEngine.START_PATH:
+            return {"quoteId": QUOTE_ID}
+        if path == axa.HttpQuoteEngine.VEHICLE_LOOKUP_PATH:
+            if not self.vehicle:
+                return {"vehicle": None}
+            return {"vehicle": {"id": "vehicle-1", "description": "STUB MOTORS 1.2 PETROL"}}
+        if path == axa.HttpQuoteEngine.QUOTE_PATH:
+            return {"premium": "€1,512.34", "quoteReferenceId": "REF1234"}
+        return {"quoteId": QUOTE_ID}
+
+@pytest.fixture
+def stub():
+    return RecordingStub()
+
+@pytest.fixture
+def stub_url(stub):
+    class StubRequestHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            body = json.dumps(stub.respond(self.path, payload)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def config():
+    return axa.Config("Up to 10,000 km", "John", "Doe", "1950-01-02", "0899999999", "username@email.com",
+        "Software Developer", "T33LOL1", "Less than 1 year", ["11L80085"])
+
+@pytest.fixture
+def engine(logger, stub_url):
+    vehicle_cache = axa.VehicleCache(":memory:", logger)
+    yield axa.HttpQuoteEngine(logger, axa.Tracer(logger), vehicle_cache, base_url=stub_url)
+    vehicle_cache.close()
+
+def test_get_quote_posts_the_form_in_order(engine, stub, config):
+    quote = engine.get_quote(config, "11L80085")
+
+    assert (quote.registration, quote.car_name, quote.reference_id, quote.price) == \
+        ("11L80085", "STUB MOTORS 1.2 PETROL", "REF1234", 1512.34)
+    assert stub.requests == [
+        ("/api/car-quote/start", {}),
+        ("/api/car-quote/vehicle-lookup", {
+            "quoteId": QUOTE_ID,
+            "hasRegNumber": True,
+            "vehicleRegistrationNumber": "11L80085",
+        }),
+        ("/api/car-quote/vehicle-details", {
+            "quoteId": QUOTE_ID,
+            "vehicleId": "vehicle-1",
+            "confirmCar": True,
+            "isVehicleForBusinessUse": False,
+            "isVehicleForCommutingUse": True,
+            "annualDistanceDriven": "Up to 10,000 km",
+        }),
+        ("/api/car-quote/proposer-details", {
+            "quoteId": QUOTE_ID,
+            "title": "MR",
+            "firstName": "John",
+            "lastName": "Doe",
+            "dateOfBirth": "1950-01-02",
+            "emailAddress": "username@email.com",
+            "phoneNumber": "0899999999",
+            "employmentStatus": "EMPLOYED",
+            "occupation": "Software Developer",
+            "eirCode": "T33LOL1",
+            "householdType": "RENTED_ACCOMMODATION",
+        }),
+        ("/api/car-quote/driving-history", {
+            "quoteId": QUOTE_ID,
+            "drivingLicenceType": "ROI_PROVISIONAL",
+            "advancedDriverTraining": False,
+            "yearsLicenceHeld": "Less than 1 year",
+            "hasPenaltyPoints": False,
+            "drivingExperience": "NO_PREVIOUS_INSURANCE",
+        }),
+        ("/api/car-quote/cover-details", {
+            "quoteId": QUOTE_ID,
+            "hasMultiProductDiscount": False,
+            "confirmAssumptions": True,
+        }),
+        ("/api/car-quote/quote", {"quoteId": QUOTE_ID}),
+        ("/api/car-quote/save", {"quoteId": QUOTE_ID}),
+    ]
+
+def test_get_quote_stops_when_no_vehicle_is_found(engine, stub, config):
+    stub.vehicle = False
+
+    with pytest.raises(axa.VehicleNotFoundError):
+        engine.get_quote(config, "11L80085")
+    assert [path for path, payload in stub.requests] == ["/api/car-quote/start", "/api/car-quote/vehicle-lookup"]
@@ -0,0 +1,59 @@
+import pytest
+
+import axa
+
+def get_profile(name, date_of_birth="1950-01-01"):
+    return axa.Profile(name, "Up to 10,000 km", "John", "Doe", date_of_birth, "0899999999", "username@email.com",
+        "Software Developer", "T33LOL1", "Less than 1 year")
+
+def get_config(registrations, profiles=None, quote_pairs=(), **kwargs):
+    return axa.Config("Up to 10,000 km", "John", "Doe", "1950-01-01", "0899999999", "username@email.com",
+        "Software Developer", "T33LOL1", "Less than 1 year", registrations,
+        profiles=profiles,
+        quote_pairs=quote_pairs,
+        **kwargs)
+
+def test_every_profile_is_quoted_for_every_registration():
+    config = get_config(["11L80085", "08C100"], profiles=[get_profile("old"), get_profile("young", "2000-01-01")])
+
+    jobs = axa.plan_quote_jobs(config)
+
+    assert [(job.profile.name, job.registration) for job in jobs] == \
+        [("old", "11L80085"), ("old", "08C100"), ("young", "11L80085"), ("young", "08C100")]
+
+def test_the_same_registration_with_the_same_answers_is_quoted_once():
+    # 'copy' has the same answers as 'old' under another name
+    config = get_config(["11L80085", "11-l-80085"], profiles=[get_profile("old"), get_profile("copy")],
+        quote_pairs=[("old", "08C100"), ("copy", "08 C 100")])
+
+    jobs = axa.plan_quote_jobs(config)
+
+    assert [(job.profile.name, job.registration) for job in jobs] == [("old", "11L80085"), ("old", "08C100")]
+
+@pytest.mark.parametrize("shard_count", [1, 2, 3, 5])
+def test_shards_split_the_jobs_between_them(shard_count):
+    config = get_config([f"{10 + index % 14}D{1000 + index}" for index in range(50)],
+        profiles=[get_profile("old"), get_profile("young", "2000-01-01")])
+    jobs = axa.plan_quote_jobs(config)
+
+    shards = [axa.get_shard_jobs(jobs, shard_index, shard_count) for shard_index in range(shard_count)]
+
+    keys = [job.key for shard in shards for job in shard]
+    assert sorted(keys) == sorted(job.key for job in jobs)
+    assert len(set(keys)) == len(keys)
+
+def test_a_job_stays_on_its_shard_when_other_jobs_change():
+    jobs = axa.plan_quote_jobs(get_config(["11L80085", "08C100", "191D12345"]))
+    more_jobs = axa.plan_quote_jobs(get_config(["11L80085", "08C100", "191D12345", "12D1000", "13D2000"]))
+
+    for shard_index in range(3):
+        keys = set(job.key for job in axa.get_shard_jobs(jobs, shard_index, 3))
+        assert keys <= set(job.key for job in axa.get_shard_jobs(more_jobs, shard_index, 3))
+
+def test_a_config_built_directly_plans_every_job_on_one_shard():
+    config = get_config(["11L80085", "08C100"], engine="http")
+    quote_handler = axa.QuoteHandler(config)
+
+    assert len(quote_handler.plan_jobs(config)) == 2
+    quote_handler.tracer.close()
+    quote_handler.vehicle_cache.close()
@@ -0,0 +1,76 @@
+import threading
+
+from time import sleep
+
+import pytest
+import requests
+
+import axa
+import mock_axa
+
+@pytest.fixture
+def mock(logger, request):
+    # parametrized with the failure rate
+    return mock_axa.MockAxa(logger, failure_rate=getattr(request, "param", 0.0), not_found_registrations=["99D99999"])
+
+@pytest.fixture
+def mock_url(mock):
+    server = mock_axa.start_mock_server(mock)
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def config(mock_url):
+    return axa.Config("Up to 10,000 km", "John", "Doe", "1950-01-01", "0899999999", "username@email.com",
+        "Software Developer", "T33LOL1", "Less than 1 year", ["11L80085"],
+        engine="http",
+        base_url=mock_url + "/",
+        circuit_breaker_threshold=0)
+
+@pytest.fixture
+def quote_handler(config):
+    quote_handler = axa.QuoteHandler(config)
+    yield quote_handler
+    quote_handler.tracer.close()
+    quote_handler.vehicle_cache.close()
+
+@pytest.mark.parametrize("mock", [1.0], indirect=True)
+def test_only_retried_attempts_are_counted_as_retries(quote_handler, config, registry):
+    assert quote_handler.get_quote(config, "11L80085", retry=3, sleep_time=0) is None
+    assert registry.get_sample_value("failed_attempts_total") == 3
+    # the last attempt is not retried
+    assert registry.get_sample_value("quote_retries_total", {"error_class": "unknown"}) == 2
+
+def test_permanent_errors_are_not_retried(quote_handler, config, mock, registry):
+    assert quote_handler.get_quote(config, "99D99999", retry=3, sleep_time=0) is None
+    assert registry.get_sample_value("failed_attempts_total") == 1
+    assert registry.get_sample_value("quote_retries_total", {"error_class": "vehicle_not_found"}) is None
+    assert mock.get_requests() == ["start", "vehicle-lookup"]
+
+def test_http_engine_answers_the_mock_in_order(quote_handler, config, mock_url, registry):
+    quote = quote_handler.get_quote(config, "11-L-80085", retry=1, sleep_time=0)
+
+    assert quote.car_name == "MOCK MOTORS 085 1.2 PETROL"
+    assert quote.reference_id.startswith("MCK")
+    assert registry.get_sample_value("quote_prices", {"profile": "default", "registration": "11-L-80085", "car_name": quote.car_name}) == quote.price
+    assert requests.get(f"{mock_url}/__mock__/requests").json() == \
+        ["start", "vehicle-lookup", "vehicle-details", "proposer-details", "driving-history", "cover-details", "quote", "save"]
+
+def test_registrations_the_lookup_did_not_find_are_skipped(quote_handler, config, mock):
+    assert quote_handler.get_quote(config, "99D99999", retry=1, sleep_time=0) is None
+    mock.reset()
+
+    assert quote_handler.get_quote(config, "99-D-99999", retry=1, sleep_time=0) is None
+    assert mock.get_requests() == []
+
+@pytest.mark.parametrize("mock", [1.0], indirect=True)
+def test_stopping_abandons_the_backoff_sleep(quote_handler, config, registry):
+    thread = threading.Thread(target=quote_handler.get_quote, args=(config, "11L80085"), kwargs={"retry": 3, "sleep_time": 60}, daemon=True)
+    thread.start()
+    sleep(0.5)
+
+    quote_handler.stop()
+    thread.join(1)
+    assert not thread.is_alive()
+    assert registry.get_sample_value("failed_attempts_total") == 1
@@ -0,0 +1,32 @@
+import pytest
+import requests
+
+import axa
+
+@pytest.fixture
+def status_url(logger):
+    status_server = axa.StatusServer(logger, 0, address="127.0.0.1")
+    axa.ResourceProfiler(logger).add_routes(status_server)
+    status_server.start()
+    yield f"http://127.0.0.1:{status_server.port}"
+    status_server.shutdown()
+
+@pytest.mark.parametrize("query", ["seconds=0", "seconds=-1", "seconds=nan", "interval_ms=0", "interval_ms=-5", "interval_ms=inf", "seconds=1&interval_ms=2000"])
+def test_cpu_profile_rejects_invalid_durations(status_url, query):
+    response = requests.get(f"{status_url}/debug/cpu-profile?{query}", timeout=5)
+
+    assert response.status_code == 400
+
+def test_cpu_profile_returns_collapsed_stacks(status_url):
+    response = requests.get(f"{status_url}/debug/cpu-profile?seconds=0.2&interval_ms=10", timeout=5)
+
+    assert response.status_code == 200
+    for line in response.text.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert stack and int(count) > 0
+
+def test_resources_are_sampled_on_demand(status_url):
+    response = requests.get(f"{status_url}/debug/resources", timeout=5)
+
+    assert response.status_code == 200
+    assert "python" in response.text
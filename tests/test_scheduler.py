@@ -0,0 +1,103 @@
+import threading
+
+from time import sleep, time
+
+import pytest
+
+import axa
+
+@pytest.fixture
+def job():
+    profile = axa.Profile("default", "Up to 10,000 km", "John", "Doe", "1950-01-01", "0899999999", "username@email.com",
+        "Software Developer", "T33LOL1", "Less than 1 year")
+    return axa.QuoteJob(profile, "11L80085")
+
+@pytest.fixture
+def scheduler(logger):
+    return axa.QuoteScheduler(logger, lambda job: None, interval_seconds=100, min_interval_seconds=40, max_interval_seconds=200)
+
+def get_quote(price):
+    return axa.Quote("11L80085", "MOCK MOTORS", "REF1", price)
+
+# far enough ahead for the jobs not to be running late
+DUE_TIME = time() + 10000
+
+def reschedule(scheduler, job, quote, due_time=DUE_TIME):
+    # returns the new interval and how long after due_time the job is due next
+    entry = scheduler._jobs[job.key]
+    scheduler._reschedule(entry, due_time, quote)
+    next_due_time = next(due for due, sequence, key in scheduler._queue if sequence == entry["version"])
+    return (entry["interval"], next_due_time - due_time)
+
+def test_the_first_quote_keeps_the_interval(scheduler, job):
+    scheduler.schedule(job, DUE_TIME)
+
+    assert reschedule(scheduler, job, get_quote(500)) == (100, 100)
+
+def test_an_unchanged_price_backs_off_up_to_the_max(scheduler, job):
+    scheduler.schedule(job, DUE_TIME)
+    reschedule(scheduler, job, get_quote(500))
+
+    assert reschedule(scheduler, job, get_quote(500.001)) == (150, 150)
+    assert reschedule(scheduler, job, get_quote(500)) == (200, 200)
+    assert reschedule(scheduler, job, get_quote(500)) == (200, 200)
+
+def test_a_changed_price_speeds_up_down_to_the_min(scheduler, job):
+    scheduler.schedule(job, DUE_TIME)
+    reschedule(scheduler, job, get_quote(500))
+
+    assert reschedule(scheduler, job, get_quote(510)) == (50, 50)
+    assert reschedule(scheduler, job, get_quote(520)) == (40, 40)
+
+def test_a_failed_quote_keeps_the_interval(scheduler, job):
+    scheduler.schedule(job, DUE_TIME)
+    reschedule(scheduler, job, get_quote(500))
+
+    assert reschedule(scheduler, job, None) == (100, 100)
+
+def test_a_job_running_late_is_due_right_away(scheduler, job):
+    scheduler.schedule(job, DUE_TIME)
+    now = time()
+
+    interval, delay = reschedule(scheduler, job, get_quote(500), due_time=now - 500)
+    assert now <= now - 500 + delay <= time()
+
+def test_a_removed_job_is_not_rescheduled(scheduler, job):
+    scheduler.schedule(job, DUE_TIME)
+    entry = scheduler._jobs[job.key]
+    scheduler.remove(job)
+
+    scheduler._reschedule(entry, DUE_TIME, get_quote(500))
+    assert not scheduler.has_job(job)
+    assert scheduler.get_queue_depth() == 0
+
+def test_jobs_are_spread_evenly_across_the_interval(scheduler, job):
+    jobs = [axa.QuoteJob(job.profile, registration) for registration in ("11L80085", "08C100", "12D1000", "13D2000")]
+    now = time()
+
+    scheduler.schedule_evenly(jobs)
+
+    offsets = sorted(due_time - now for due_time, sequence, key in scheduler._queue)
+    assert offsets == pytest.approx([0, 25, 50, 75], abs=1)
+
+def test_runs_due_jobs_on_at_most_workers_at_once_until_stopped(logger, job):
+    running = []
+    release = threading.Event()
+    def get_quote(job):
+        running.append(job)
+        release.wait()
+    scheduler = axa.QuoteScheduler(logger, get_quote, workers=2, interval_seconds=100, min_interval_seconds=40, max_interval_seconds=200)
+    for registration in ("11L80085", "08C100", "12D1000"):
+        scheduler.schedule(axa.QuoteJob(job.profile, registration), time())
+    thread = threading.Thread(target=scheduler.run_forever, daemon=True)
+    thread.start()
+
+    sleep(0.2)
+    assert len(running) == 2
+    assert scheduler.get_queue_depth() == 1
+
+    # stopping does not wait for the running jobs
+    scheduler.stop()
+    thread.join(1)
+    assert not thread.is_alive()
+    release.set()
@@ -0,0 +1,120 @@
+from time import time
+
+import axa
+
+def test_vehicle_cache_shares_entries_between_spellings_of_a_registration(logger):
+    vehicle_cache = axa.VehicleCache(":memory:", logger)
+    vehicle_cache.put("11-L-80085", "MOCK MOTORS 085")
+    vehicle_cache.put_invalid("08 c 100")
+
+    assert vehicle_cache.get("11L80085") == "MOCK MOTORS 085"
+    assert vehicle_cache.is_invalid("08C100")
+    assert not vehicle_cache.is_invalid("11l80085")
+
+def test_quote_store_shares_quotes_between_spellings_of_a_registration(logger, tmp_path):
+    quote_store = axa.QuoteStore(str(tmp_path / "history.db"), logger)
+    quote_store.add(axa.Quote("11-L-80085", "MOCK MOTORS 085", "REF1", 500.0), "profile", timestamp=1)
+
+    timestamp, quote = quote_store.get_latest("11l80085", "profile")
+    assert (timestamp, quote.registration, quote.price) == (1, "11L80085", 500.0)
+    assert [row["registration"] for row in quote_store.get_history(registration="11 L 80085")] == ["11L80085"]
+    quote_store.close()
+
+def test_quote_store_normalizes_registrations_stored_before(logger, tmp_path):
+    path = str(tmp_path / "history.db")
+    quote_store = axa.QuoteStore(path, logger)
+    with quote_store._connection:
+        quote_store._connection.execute(
+            "INSERT INTO quotes (timestamp, profile_hash, registration, car_name, reference_id, price) VALUES (1, 'profile', '11-l-80085', 'MOCK', 'REF1', 500)")
+    quote_store.close()
+
+    quote_store = axa.QuoteStore(path, logger)
+    assert quote_store.get_latest("11L80085", "profile")[1].registration == "11L80085"
+    quote_store.close()
+
+def test_vehicle_cache_evicts_the_least_recently_used(logger):
+    vehicle_cache = axa.VehicleCache(":memory:", logger, max_size=2)
+    vehicle_cache.put("11L80085", "MOCK MOTORS 085")
+    vehicle_cache.put("08C100", "MOCK MOTORS 100")
+    vehicle_cache.get("11L80085")
+
+    vehicle_cache.put("12D1000", "MOCK MOTORS 000")
+
+    assert vehicle_cache.get("08C100") is None
+    assert vehicle_cache.get("11L80085") == "MOCK MOTORS 085"
+    assert vehicle_cache.get("12D1000") == "MOCK MOTORS 000"
+
+def test_vehicle_cache_expires_entries(logger):
+    vehicle_cache = axa.VehicleCache(":memory:", logger, ttl_seconds=0)
+    vehicle_cache.put("11L80085", "MOCK MOTORS 085")
+    vehicle_cache.put_invalid("08C100")
+
+    assert vehicle_cache.get("11L80085") is None
+    assert vehicle_cache.is_invalid("08C100")
+
+def test_vehicle_cache_expires_registrations_not_found_on_their_own(logger):
+    vehicle_cache = axa.VehicleCache(":memory:", logger, not_found_ttl_seconds=0)
+    vehicle_cache.put("11L80085", "MOCK MOTORS 085")
+    vehicle_cache.put_invalid("08C100")
+
+    assert vehicle_cache.get("11L80085") == "MOCK MOTORS 085"
+    assert not vehicle_cache.is_invalid("08C100")
+
+def test_vehicle_cache_is_kept_across_restarts(logger, tmp_path, unregister_metrics):
+    path = str(tmp_path / "history.db")
+    vehicle_cache = axa.VehicleCache(path, logger)
+    vehicle_cache.put("11L80085", "MOCK MOTORS 085")
+    vehicle_cache.put_invalid("08C100")
+    vehicle_cache.close()
+    unregister_metrics()
+
+    vehicle_cache = axa.VehicleCache(path, logger)
+    assert vehicle_cache.get("11L80085") == "MOCK MOTORS 085"
+    assert vehicle_cache.is_invalid("08C100")
+    vehicle_cache.close()
+
+def test_vehicle_cache_follows_what_the_website_shows(logger, registry):
+    vehicle_cache = axa.VehicleCache(":memory:", logger)
+    vehicle_cache.put("11L80085", "MOCK MOTORS 085")
+
+    vehicle_cache.confirm("11L80085", "MOCK MOTORS 085")
+    assert registry.get_sample_value("vehicle_cache_invalidations_total") == 0
+
+    vehicle_cache.confirm("11L80085", "OTHER MOTORS 085")
+    assert registry.get_sample_value("vehicle_cache_invalidations_total") == 1
+    assert vehicle_cache.get("11L80085") == "OTHER MOTORS 085"
+
+class RecordingDriver:
+    def __init__(self, cookies=()):
+        self.cookies = list(cookies)
+        self.commands = []
+
+    def execute_cdp_cmd(self, cmd, params):
+        self.commands.append((cmd, params))
+        return {"cookies": self.cookies}
+
+def test_session_snapshot_is_only_invalidated_by_the_consent_and_session_cookies(logger):
+    now = time()
+    session_snapshot = axa.SessionSnapshot(logger)
+    session_snapshot.save(RecordingDriver([
+        {"name": "_evidon_consent_cookie", "value": "accepted", "expires": now + 3600},
+        {"name": "ASP.NET_SessionId", "value": "1", "expires": -1},
+        {"name": "_ga", "value": "1", "expires": now - 1},
+    ]))
+    assert session_snapshot.is_valid()
+
+    driver = RecordingDriver()
+    session_snapshot.inject(driver)
+    assert [cookie["name"] for cookie in driver.commands[0][1]["cookies"]] == ["_evidon_consent_cookie", "ASP.NET_SessionId"]
+
+def test_session_snapshot_needs_a_current_consent_cookie(logger):
+    now = time()
+    session_snapshot = axa.SessionSnapshot(logger)
+    session_snapshot.save(RecordingDriver([{"name": "ASP.NET_SessionId", "value": "1", "expires": -1}]))
+    assert not session_snapshot.is_valid()
+
+    session_snapshot.save(RecordingDriver([{"name": "_evidon_consent_cookie", "value": "accepted", "expires": now - 1}]))
+    assert not session_snapshot.is_valid()
+    driver = RecordingDriver()
+    session_snapshot.inject(driver)
+    assert driver.commands == []